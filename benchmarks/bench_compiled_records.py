@@ -0,0 +1,25 @@
+import time
+
+from file_management.read_write_files import iter_records, iter_compiled_records
+
+
+# Comparing the dictionary records of iter_records with the compiled converters of iter_compiled_records (rows/sec).
+# Run it from the root folder of the repository: python -m benchmarks.bench_compiled_records
+
+def rows_per_sec(iter_function, file_name, repeat=5):
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _ in iter_function(file_name):
+            rows += 1
+    return int(rows / (time.perf_counter() - start))
+
+
+def main():
+    assert list(iter_compiled_records('data/taxi.csv')) == [tuple(r.values()) for r in iter_records('data/taxi.csv')]
+    print('iter_records rows/sec:         ', rows_per_sec(iter_records, 'data/taxi.csv'))
+    print('iter_compiled_records rows/sec:', rows_per_sec(iter_compiled_records, 'data/taxi.csv'))
+
+
+if __name__ == "__main__":
+    main()
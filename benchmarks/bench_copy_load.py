@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from benchmarks.harness import StandInConnection
+from benchmarks.sample_data import opfcp_like
+from db.bulk_load import copy_parquet, encode_batches
+from file_management.parquet_read import iter_rows
+
+
+# Loading an opfcp.parquet sized file into a stand-in connection (benchmarks/harness.py, there is no Postgres server
+# here):
+#   - the client side of one INSERT per row from dictionaries (the statement and its parameters per row)
+#   - encoding the batches for COPY in the text and the binary format
+#   - copy_parquet() into a connection that "sends" with a given speed (sleeps), to see the overlap of the encoding
+#     and the sending: the time should be close to max(encoding, sending), not their sum
+# Run it from the root folder of the repository: python -m benchmarks.bench_copy_load [rows] [network MB/s]
+
+def main(rows, mb_per_sec):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'opfcp.parquet')
+        pq.write_table(pa.Table.from_pandas(opfcp_like(rows), preserve_index=False), path)
+        print('{0} rows'.format(rows))
+
+        start = time.perf_counter()
+        statement = 'insert into opfcp (c_mag, c_ean, price, c_promo, m_promo_price) values (%s, %s, %s, %s, %s)'
+        for row in iter_rows(path):
+            row = row._asdict()
+            parameters = (row['c_mag'], row['c_ean'], row['price'], row['c_promo'], row['m_promo_price'])
+        print('{0:28} {1:6.2f} s (client side only, without the round trips)'.format(
+            'INSERT per row', time.perf_counter() - start))
+
+        encode_secs = {}
+        for format in ['text', 'binary']:
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in encode_batches(pq.ParquetFile(path).iter_batches(65536), format))
+            encode_secs[format] = time.perf_counter() - start
+            print('{0:28} {1:6.2f} s {2:7.1f} MB {3:9.0f} rows/s'.format(
+                'encode ' + format, encode_secs[format], size / 1024 ** 2, rows / encode_secs[format]))
+            send_secs = size / 1024 ** 2 / mb_per_sec
+            start = time.perf_counter()
+            copy_parquet(StandInConnection(mb_per_sec=mb_per_sec), path, 'opfcp', format=format)
+            print('{0:28} {1:6.2f} s (encode + send in sequence: {2:.2f} s)'.format(
+                'copy_parquet {0} {1} MB/s'.format(format, mb_per_sec), time.perf_counter() - start,
+                encode_secs[format] + send_secs))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, float(sys.argv[2]) if len(sys.argv) > 2 else 50)
@@ -0,0 +1,49 @@
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from file_management.df_csv_cache import read_csv_cached
+
+
+# Cold (pd.read_csv) and warm (memory mapped from the cache) timings of read_csv_cached, with the options of
+# file_management/df_save_load_csv.py, but without the object dtype of the date columns: those columns of Python
+# objects would come back from the cache as datetime64, so they are not cached.
+# Run it from the root folder of the repository: python -m benchmarks.bench_csv_cache
+
+ZIP_OPTIONS = dict(skiprows=1, skip_blank_lines=True, delimiter=',', header=None, compression='zip',
+                   names=['vendor_id', 'tpep_pickup_datetime', 'tpep_dropoff_datetime', 'passenger_count',
+                          'trip_distance', 'ratecode_id', 'store_and_fwd_flag', 'PULocationID', 'DOLocationID',
+                          'payment_type', 'fare_amount', 'extra', 'mta_tax', 'tip_amount', 'tolls_amount',
+                          'improvement_surcharge', 'total_amount'])
+
+CSV_OPTIONS = dict(skip_blank_lines=True, delimiter=',', decimal='.', encoding='utf8', header=0,
+                   index_col=['VendorID', 'tpep_pickup_datetime'],
+                   usecols=['VendorID', 'passenger_count', 'tip_amount', 'total_amount', 'tpep_dropoff_datetime',
+                            'tpep_pickup_datetime', 'trip_distance'],
+                   dtype={'VendorID': np.int32, 'passenger_count': int, 'tip_amount': np.float64,
+                          'total_amount': np.float64, 'trip_distance': float},
+                   parse_dates=['tpep_pickup_datetime', 'tpep_dropoff_datetime'])
+
+
+def best_of(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for file_name, options in [('data/taxi.zip', ZIP_OPTIONS), ('data/taxi.csv', CSV_OPTIONS)]:
+            cold = best_of(lambda: pd.read_csv(file_name, **options))
+            read_csv_cached(file_name, cache_dir, **options)  # filling the cache
+            warm = best_of(lambda: read_csv_cached(file_name, cache_dir, **options))
+            print('{0:15} cold {1:7.1f} ms   warm {2:7.1f} ms'.format(file_name, cold, warm))
+
+
+if __name__ == "__main__":
+    main()
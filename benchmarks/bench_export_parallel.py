@@ -0,0 +1,32 @@
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from file_management.df_export_parallel import to_csv_compressed
+
+
+# Exporting df2 of file_management/df_save_load_csv.py (repeated to have more data) into a zip file: with to_csv and
+# with to_csv_compressed, with different numbers of threads.
+# Run it from the root folder of the repository: python -m benchmarks.bench_export_parallel
+
+def main():
+    df2 = pd.read_csv('data/taxi.csv', index_col=['VendorID', 'tpep_pickup_datetime'],
+                      usecols=['VendorID', 'passenger_count', 'tip_amount', 'total_amount', 'tpep_dropoff_datetime',
+                               'tpep_pickup_datetime', 'trip_distance'],
+                      parse_dates=['tpep_pickup_datetime', 'tpep_dropoff_datetime'])
+    df2 = pd.concat([df2] * 50)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'exported_df.zip')
+        start = time.perf_counter()
+        df2.to_csv(path, compression={'method': 'zip', 'archive_name': 'df2.csv'}, date_format='%Y-%m-%d %H:%M:%S')
+        print('to_csv:                       {0:6.2f} s'.format(time.perf_counter() - start))
+        for workers in sorted({1, 2, 4, os.cpu_count()}):
+            start = time.perf_counter()
+            to_csv_compressed(df2, path, archive_name='df2.csv', workers=workers, date_format='%Y-%m-%d %H:%M:%S')
+            print('to_csv_compressed {0:2} threads: {1:6.2f} s'.format(workers, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
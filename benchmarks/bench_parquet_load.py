@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from benchmarks.harness import peak_rss_mb, run_in_process
+from benchmarks.sample_data import opfcp_like
+from file_management.parquet_read import read_pandas_low_memory
+
+
+# Peak memory (RSS) and time of loading an opfcp.parquet sized file into pandas: the two-step way of
+# file_management/df_save_load_parquet.py and read_pandas_low_memory(). Every variant runs in its own process.
+# Run it from the root folder of the repository: python -m benchmarks.bench_parquet_load [rows]
+
+def run(variant, path):
+    start = time.perf_counter()
+    if variant == 'two-step':
+        opfcp_parquet = pq.read_table(path)
+        opfcp = opfcp_parquet.to_pandas()
+        del opfcp_parquet
+    else:
+        opfcp = read_pandas_low_memory(path)
+    secs = time.perf_counter() - start
+    peak_mb = peak_rss_mb()
+    print('{0:10} {1:6.2f} s {2:8.1f} MB peak RSS ({3:.1f} MB dataframe)'.format(
+        variant, secs, peak_mb, opfcp.memory_usage(deep=True).sum() / 1024 ** 2))
+
+
+def main(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'opfcp.parquet')
+        # the file is written by another process too, because the child processes start with the peak RSS of
+        # the parent process
+        run_in_process('benchmarks.bench_parquet_load', '--make', str(rows), path)
+        print('{0} rows, {1:.1f} MB file'.format(rows, os.path.getsize(path) / 1024 ** 2))
+        for variant in ['two-step', 'low-memory']:
+            run_in_process('benchmarks.bench_parquet_load', '--run', variant, path)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--make']:
+        pq.write_table(pa.Table.from_pandas(opfcp_like(int(sys.argv[2])), preserve_index=False), sys.argv[3])
+    elif sys.argv[1:2] == ['--run']:
+        run(*sys.argv[2:4])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000000)
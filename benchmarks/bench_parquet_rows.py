@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+from benchmarks.harness import peak_rss_mb, run_in_process
+from file_management.parquet_read import iter_rows
+
+
+# Peak memory (RSS) and time per row of going through the rows of an opfcp.parquet sized file: the list of
+# dictionaries of file_management/parquet_to_dicts.py and iter_rows(). Every variant runs in its own process.
+# Run it from the root folder of the repository: python -m benchmarks.bench_parquet_rows [rows]
+
+def run(variant, path):
+    start = time.perf_counter()
+    total, rows = 0.0, 0
+    if variant == 'to_pydict':
+        table_dict = dict(pq.read_table(path).to_pydict())
+        keys = list(table_dict.keys())
+        pivoted_values = list(zip(*table_dict.values()))
+        table_dictionary_array = []
+        for record in pivoted_values:
+            table_dictionary_array.append(dict(zip(keys, record)))
+        for row in table_dictionary_array:
+            total += row['price']
+            rows += 1
+    else:
+        for row in iter_rows(path):
+            total += row['price']
+            rows += 1
+    secs = time.perf_counter() - start
+    peak_mb = peak_rss_mb()
+    print('{0:10} {1:6.2f} s {2:7.0f} ns/row {3:8.1f} MB peak RSS'.format(variant, secs, secs / rows * 1e9, peak_mb))
+
+
+def main(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'opfcp.parquet')
+        run_in_process('benchmarks.bench_parquet_load', '--make', str(rows), path)
+        print('{0} rows, {1:.1f} MB file'.format(rows, os.path.getsize(path) / 1024 ** 2))
+        for variant in ['to_pydict', 'iter_rows']:
+            run_in_process('benchmarks.bench_parquet_rows', '--run', variant, path)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--run']:
+        run(*sys.argv[2:4])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000000)
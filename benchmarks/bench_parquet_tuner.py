@@ -0,0 +1,41 @@
+import sys
+
+import pyarrow.parquet as pq
+
+from benchmarks.sample_data import opfcp_like
+from file_management.parquet_write import tune_writer, writer_configs
+
+
+# Recommended parquet writer settings for the opfcp and the taxi data, from tune_writer() with typical queries.
+# Run it from the root folder of the repository: python -m benchmarks.bench_parquet_tuner [opfcp rows]
+
+COLUMNS = ['row_group_size', 'compression', 'compression_level', 'use_dictionary', 'write_statistics',
+           'write_mb_per_sec', 'file_bytes', 'read_secs', 'score']
+
+
+def report(name, data, queries, row_group_sizes):
+    recommended, results = tune_writer(data, queries, writer_configs(row_group_sizes=row_group_sizes))
+    print(name)
+    print(results[COLUMNS].head(10).to_string())
+    print('recommended:', recommended)
+    print()
+
+
+def main(rows):
+    opfcp = opfcp_like(rows)
+    report('opfcp, {0} rows'.format(rows), opfcp,
+           [(['c_ean', 'price'], [('c_mag', '=', 42)]),
+            (['c_ean', 'm_promo_price'], [('c_promo', '!=', 'N')]),
+            (['price'], [('c_ean', 'between', (5050000, 5051000))])],
+           (65536, 262144, 1048576))
+
+    taxi = pq.read_table('data/taxi.parquet')
+    report('taxi, {0} rows'.format(taxi.num_rows), taxi,
+           [(['tip_amount', 'total_amount'], [('VendorID', '=', 1)]),
+            (['trip_distance'], [('passenger_count', '>', 2)]),
+            (['fare_amount'], [])],
+           (1000, 5000, 10000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+from benchmarks.harness import peak_rss_mb, run_in_process
+from file_management.parquet_read import read_pandas_typed
+
+
+# Peak memory (RSS), time and dataframe memory of loading an opfcp.parquet sized file with the target data types:
+# to_pandas() and then astype(), as in file_management/df_save_load_parquet.py, and read_pandas_typed().
+# Every variant runs in its own process.
+# Run it from the root folder of the repository: python -m benchmarks.bench_parquet_typed [rows]
+
+def run(variant, path):
+    start = time.perf_counter()
+    if variant == 'astype':
+        opfcp = pq.read_table(path).to_pandas()
+        opfcp = opfcp.astype({'price': 'float64', 'c_ean': 'int32', 'c_mag': 'string', 'c_promo': 'string'})
+    elif variant == 'typed-string':
+        opfcp = read_pandas_typed(path, {'price': 'float64', 'c_ean': 'int32', 'c_mag': 'string', 'c_promo': 'string'})
+    else:
+        opfcp = read_pandas_typed(path, {'price': 'float64', 'c_ean': 'int32', 'c_mag': 'category',
+                                         'c_promo': 'category'})
+    secs = time.perf_counter() - start
+    peak_mb = peak_rss_mb()
+    print('{0:15} {1:6.2f} s {2:8.1f} MB peak RSS {3:8.1f} MB dataframe'.format(
+        variant, secs, peak_mb, opfcp.memory_usage(deep=True).sum() / 1024 ** 2))
+
+
+def main(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'opfcp.parquet')
+        run_in_process('benchmarks.bench_parquet_load', '--make', str(rows), path)
+        print('{0} rows, {1:.1f} MB file'.format(rows, os.path.getsize(path) / 1024 ** 2))
+        for variant in ['astype', 'typed-string', 'typed-category']:
+            run_in_process('benchmarks.bench_parquet_typed', '--run', variant, path)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--run']:
+        run(*sys.argv[2:4])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000000)
@@ -0,0 +1,50 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import StandInConnection
+from db.pool import ConnectionPool
+
+
+# Latency of short requests with a new connection per request (as create_conn_from_config()) and with a
+# ConnectionPool, against a stand-in connection (there is no Postgres server here): opening a connection takes
+# connect_ms, a query takes query_ms (both are sleeps, like waiting for the network).
+# Run it from the root folder of the repository: python -m benchmarks.bench_pool [requests] [threads]
+
+CONNECT_SECS = 0.02
+QUERY_SECS = 0.001
+
+
+def new_connection():
+    return StandInConnection(QUERY_SECS, connect_secs=CONNECT_SECS)
+
+
+def new_connection_request(_):
+    start = time.perf_counter()
+    conn = new_connection()
+    with conn.cursor() as cursor:
+        cursor.execute('select 1')
+    conn.close()
+    return time.perf_counter() - start
+
+
+def main(requests, threads):
+    pool = ConnectionPool(new_connection, min_size=threads, max_size=threads)
+
+    def pooled_request(_):
+        start = time.perf_counter()
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('select 1')
+        return time.perf_counter() - start
+
+    for name, request in [('new connection', new_connection_request), ('pool', pooled_request)]:
+        with ThreadPoolExecutor(threads) as executor:
+            latencies = sorted(executor.map(request, range(requests)))
+        print('{0:15} mean {1:6.2f} ms, p95 {2:6.2f} ms'.format(
+            name, sum(latencies) / requests * 1000, latencies[int(requests * 0.95)] * 1000))
+    print(pool.stats())
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else 8)
@@ -0,0 +1,33 @@
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+from db.query_cache import QueryCache
+
+
+# Time of a reference query with pd.read_sql_query() and with QueryCache.read_sql_query() against a local sqlite
+# database as a stand-in (there is no Postgres server here, so the network round trip is not included), and the size
+# of the cached result.
+# Run it from the root folder of the repository: python -m benchmarks.bench_query_cache [cities] [repeat]
+
+def main(cities, repeat):
+    conn = sqlite3.connect(':memory:')
+    conn.execute('create table city (city_id integer primary key, city text, country_id integer)')
+    conn.executemany('insert into city values (?, ?, ?)', [(i, 'City {0}'.format(i), i % 109) for i in range(cities)])
+    query = 'select city_id, city, country_id from city'
+    cache = QueryCache(ttl=300)
+    for name, read in [('read_sql_query', lambda: pd.read_sql_query(query, conn, index_col=['city_id'])),
+                       ('QueryCache', lambda: cache.read_sql_query(query, conn, index_col=['city_id']))]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            df = read()
+        print('{0:15} {1:8.3f} ms per query'.format(name, (time.perf_counter() - start) / repeat * 1000))
+    stats = cache.stats()
+    print('cached: {0:.1f} kB (the dataframe: {1:.1f} kB), hits {2}, misses {3}'.format(
+        stats['memory_bytes'] / 1024, df.memory_usage(deep=True).sum() / 1024, stats['hits'], stats['misses']))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 600, int(sys.argv[2]) if len(sys.argv) > 2 else 500)
@@ -0,0 +1,86 @@
+import datetime
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.harness import peak_rss_mb, run_in_process
+from db.streaming import stream_query
+
+
+# Peak memory (RSS) and time of going through a big query result with fetchall() into one dataframe and with
+# stream_query(), against a stand-in named cursor (there is no Postgres server here): it creates the rows on demand,
+# and every fetch waits fetch_ms per 10000 rows, like a network round trip. The caller works work_ms per chunk, which
+# overlaps with fetching the next chunk in stream_query(). Every variant runs in its own process.
+# Run it from the root folder of the repository: python -m benchmarks.bench_stream_query [rows]
+
+FETCH_SECS = 0.01
+WORK_SECS = 0.01
+START = datetime.datetime(2005, 5, 24)
+
+
+class StandInCursor:
+    description = [('rental_id',), ('rental_date',), ('staff_id',), ('amount',)]
+    itersize = 2000
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.position = 0
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchmany(self, size):
+        end = min(self.position + size, self.rows)
+        time.sleep(FETCH_SECS * (end - self.position) / 10000)
+        rows = [(i, START + datetime.timedelta(minutes=i), 1 + i % 2, i % 1000 / 100)
+                for i in range(self.position, end)]
+        self.position = end
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(self.rows - self.position)
+
+    def close(self):
+        pass
+
+
+class StandInConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return StandInCursor(self.rows)
+
+
+def run(variant, rows):
+    conn = StandInConnection(int(rows))
+    start = time.perf_counter()
+    total = 0.0
+    if variant == 'fetchall':
+        cursor = conn.cursor()
+        cursor.execute('select * from rental')
+        df = pd.DataFrame(cursor.fetchall(), columns=[column[0] for column in cursor.description])
+        for position in range(0, len(df), 100000):
+            total += df['amount'].iloc[position:position + 100000].sum()
+            time.sleep(WORK_SECS)
+    else:
+        for chunk in stream_query(conn, 'select * from rental', chunk_rows=100000, dtypes={'staff_id': 'int8'}):
+            total += chunk['amount'].sum()
+            time.sleep(WORK_SECS)
+    secs = time.perf_counter() - start
+    peak_mb = peak_rss_mb()
+    print('{0:12} {1:6.2f} s {2:8.1f} MB peak RSS'.format(variant, secs, peak_mb))
+
+
+def main(rows):
+    print('{0} rows'.format(rows))
+    for variant in ['fetchall', 'stream']:
+        run_in_process('benchmarks.bench_stream_query', '--run', variant, str(rows))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--run']:
+        run(*sys.argv[2:4])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000000)
@@ -0,0 +1,64 @@
+import csv
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import peak_rss_mb, run_in_process
+from file_management.read_write_files import columns, iter_records, write_csv_by_dict
+
+
+# Peak memory (RSS) of write_csv_by_dict, compared with collecting all the records first and writing them at once.
+# Every variant runs in its own process, so that the peak RSS values do not affect each other.
+# Run it from the root folder of the repository: python -m benchmarks.bench_streaming_writer [copies]
+
+def collect_and_write(file_name, new_file_name):
+    """The previous way of writing: all the records are kept in a list and written at once."""
+    with open(new_file_name, 'wt', newline='') as new_file:
+        writer = csv.DictWriter(new_file, fieldnames=[col.dest for col in columns])
+        writer.writeheader()
+        file_content = []
+        for record in iter_records(file_name):
+            file_content.append(record)
+        writer.writerows(file_content)
+
+
+def replicate(file_name, new_file_name, copies):
+    """This function creates a bigger file, which contains the rows of the file copies times."""
+    with open(file_name, 'rt', newline='') as fp:
+        header = fp.readline()
+        rows = fp.read()
+    with open(new_file_name, 'wt', newline='') as fp:
+        fp.write(header)
+        for _ in range(copies):
+            fp.write(rows)
+
+
+def run(variant, file_name, new_file_name):
+    start = time.perf_counter()
+    if variant == 'collect':
+        collect_and_write(file_name, new_file_name)
+    elif variant == 'stream':
+        write_csv_by_dict(file_name, new_file_name)
+    elif variant == 'stream-batches':
+        write_csv_by_dict(file_name, new_file_name, batch_size=65536)
+    secs = time.perf_counter() - start
+    peak_mb = peak_rss_mb()
+    print('{0:15} {1:8.1f} s {2:10.1f} MB peak RSS'.format(variant, secs, peak_mb))
+
+
+def main(copies):
+    with tempfile.TemporaryDirectory() as tmp:
+        file_name = os.path.join(tmp, 'taxi_big.csv')
+        replicate('data/taxi.csv', file_name, copies)
+        print('input: {0} x taxi.csv, {1:.1f} MB'.format(copies, os.path.getsize(file_name) / 1024 ** 2))
+        for variant in ['collect', 'stream', 'stream-batches']:
+            run_in_process('benchmarks.bench_streaming_writer', '--run', variant, file_name,
+                           os.path.join(tmp, 'taxi_new.csv'))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--run']:
+        run(*sys.argv[2:5])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,41 @@
+import csv
+import time
+
+from file_management.read_write_files import parse_timestamp, parse_timestamps, parse_date_days
+
+
+# Comparing the per-value strptime parsing with the batch parsing of timestamps (rows per second).
+# Run it from the root folder of the repository: python -m benchmarks.bench_timestamps
+
+def load_timestamps(file_name, repeat=20):
+    """This function loads the pickup and dropoff timestamps of the file (repeated to have more data)."""
+    with open(file_name, 'rt', newline='') as fp:
+        reader = csv.DictReader(fp)
+        values = []
+        for record in reader:
+            values.append(record['tpep_pickup_datetime'])
+            values.append(record['tpep_dropoff_datetime'])
+    return values * repeat
+
+
+def main():
+    values = load_timestamps('data/taxi.csv')
+
+    start = time.perf_counter()
+    expected = [parse_timestamp(value) for value in values]
+    strptime_secs = time.perf_counter() - start
+
+    parse_date_days.cache_clear()
+    start = time.perf_counter()
+    result = parse_timestamps(values)
+    batch_secs = time.perf_counter() - start
+
+    assert result.tolist() == expected
+    print('values:                   ', len(values))
+    print('strptime rows/sec:        ', int(len(values) / strptime_secs))
+    print('parse_timestamps rows/sec:', int(len(values) / batch_secs))
+    print('speedup:                   {0:.1f}x'.format(strptime_secs / batch_secs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import sys
+import time
+
+from benchmarks.harness import StandInConnection
+from benchmarks.sample_data import opfcp_like
+from db.bulk_load import write_frame
+
+
+# Rows per second of writing a dataframe into a stand-in database (benchmarks/harness.py, there is no Postgres server
+# here): every statement waits round_trip_ms, and COPY data is "sent" with 100 MB/s. The work of the server is not
+# simulated, so the numbers show the client side and the round trips only.
+#   - row-by-row: one cursor.execute() INSERT per row, as in db/postgres.py
+#   - write_frame() append (COPY), upsert with a staging table (COPY + INSERT ... SELECT), upsert with execute_values
+# Run it from the root folder of the repository: python -m benchmarks.bench_write_frame [rows] [round trip ms]
+
+def row_by_row(conn, df):
+    cursor = conn.cursor()
+    statement = 'insert into opfcp (c_mag, c_ean, price, c_promo, m_promo_price) values (%s, %s, %s, %s, %s)'
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        cursor.execute(statement, row)
+    conn.commit()
+
+
+def main(rows, round_trip_ms):
+    df = opfcp_like(rows).drop_duplicates('c_ean')
+    conn = StandInConnection(round_trip_ms / 1000)
+    variants = [('row-by-row INSERT', lambda: row_by_row(conn, df)),
+                ('append (COPY)', lambda: write_frame(conn, df, 'opfcp')),
+                ('upsert staging', lambda: write_frame(conn, df, 'opfcp', 'upsert', 'c_ean')),
+                ('upsert execute_values', lambda: write_frame(conn, df, 'opfcp', 'upsert', 'c_ean', method='values'))]
+    print('{0} rows, {1} ms round trip'.format(len(df), round_trip_ms))
+    for name, write in variants:
+        start = time.perf_counter()
+        write()
+        secs = time.perf_counter() - start
+        print('{0:22} {1:6.2f} s {2:10.0f} rows/s'.format(name, secs, len(df) / secs))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000, float(sys.argv[2]) if len(sys.argv) > 2 else 0.1)
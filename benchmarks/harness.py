@@ -0,0 +1,72 @@
+import resource
+import subprocess
+import sys
+import time
+
+from psycopg2.extensions import adapt
+
+
+# The shared parts of the benchmarks:
+#   - a stand-in psycopg2 connection (there is no Postgres server here): every statement waits round_trip seconds,
+#     opening a connection waits connect_secs, and the statements and the COPY data are "sent" with mb_per_sec MB/s;
+#     the work of the server is not simulated, so the numbers show the client side and the network only
+#   - running a variant of a benchmark in its own process (python -m <benchmark> --run <variant> ...), so that the
+#     peak memory (RSS) values of the variants do not affect each other, and reading the peak RSS of the process
+
+class StandInCursor:
+    def __init__(self, conn):
+        self.connection = conn
+
+    def execute(self, sql, params=None):
+        if params is not None:
+            sql = sql % tuple(adapt(param).getquoted().decode('utf8') for param in params)
+        time.sleep(self.connection.round_trip + len(sql) / 1024 ** 2 / self.connection.mb_per_sec)
+
+    def mogrify(self, template, args):
+        return template % tuple(adapt(arg).getquoted() for arg in args)
+
+    def copy_expert(self, sql, file, size=8192):
+        for chunk in iter(lambda: file.read(size), b''):
+            time.sleep(len(chunk) / 1024 ** 2 / self.connection.mb_per_sec)
+        time.sleep(self.connection.round_trip)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class StandInConnection:
+    encoding = 'UTF8'
+    closed = 0
+
+    def __init__(self, round_trip=0.0, mb_per_sec=100, connect_secs=0.0):
+        self.round_trip = round_trip
+        self.mb_per_sec = mb_per_sec
+        time.sleep(connect_secs)
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def get_transaction_status(self):
+        return 0
+
+    def commit(self):
+        time.sleep(self.round_trip)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def run_in_process(module, *args):
+    """Running python -m module args in a new process, which starts without the peak RSS of this one."""
+    subprocess.run([sys.executable, '-m', module] + [str(arg) for arg in args], check=True)
+
+
+def peak_rss_mb():
+    """The peak memory (RSS) of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kilobytes on Linux
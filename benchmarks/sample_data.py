@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+
+# Sample data for the parquet benchmarks, in the shape of the opfcp.parquet file of
+# file_management/df_save_load_parquet.py (store, product EAN, price, promotion type and promotion price).
+
+def opfcp_like(rows, seed=0):
+    """This function returns a dataframe with rows rows, with the columns of opfcp.parquet."""
+    rand = np.random.default_rng(seed)
+    price = rand.uniform(0.5, 500, rows).round(2)
+    promo = rand.choice(['N', 'A', 'B', 'C', 'D'], rows, p=[0.8, 0.05, 0.05, 0.05, 0.05])
+    return pd.DataFrame({
+        'c_mag': rand.integers(1, 300, rows),
+        'c_ean': rand.integers(5000000, 5200000, rows),
+        'price': price,
+        'c_promo': promo,
+        'm_promo_price': np.where(promo == 'N', np.nan, (price * 0.8).round(2)),
+    })
@@ -0,0 +1,362 @@
+import queue
+import struct
+import threading
+import uuid
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values
+
+
+# https://www.postgresql.org/docs/current/sql-copy.html (text and binary formats)
+# https://www.psycopg.org/docs/cursor.html#cursor.copy_expert
+# https://www.psycopg.org/docs/extras.html#psycopg2.extras.execute_values
+# https://www.postgresql.org/docs/current/sql-insert.html#SQL-ON-CONFLICT
+# https://arrow.apache.org/docs/python/generated/pyarrow.parquet.ParquetFile.html (iter_batches)
+
+
+# ********** Loading a parquet file into Postgres with COPY
+
+# Going through parquet_to_dicts.py and one cursor.execute() INSERT per row (as in db/postgres.py) means a Python
+# dictionary and a round trip to the server for every row. COPY ... FROM STDIN sends all the rows in one stream, and
+# the rows can be encoded from the Arrow record batches column by column (pyarrow compute and numpy), without
+# creating Python objects per row:
+#   text:   a line per row, the values separated by tabs, \N for NULL, backslash escapes in the strings, binary
+#           values (bytea) in the hex format (\x0a1b...)
+#   binary: a header, then for every row the number of fields and (length, value) per field in network byte order;
+#           the column types of the table must match exactly (int64 -> bigint, int32 -> integer, float64 -> double
+#           precision, timestamp -> timestamp, string -> text/varchar, ...), otherwise use text
+# copy_batches() encodes the batches in a background thread while the connection sends the previous ones: it gives
+# copy_expert() a file-like CopyStream, whose read() takes the already encoded chunks from a queue.
+
+BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+BINARY_TRAILER = struct.pack('>h', -1)
+PG_EPOCH_DAYS = 10957  # 2000-01-01, the epoch of the Postgres binary date and timestamp values, in Unix days
+TEXT_ESCAPES = [('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r')]
+
+
+def quote_name(name):
+    """We quote a table or a column name (a schema-qualified table name like public.opfcp is quoted per part)."""
+    return '.'.join('"{0}"'.format(part.replace('"', '""')) for part in name.split('.'))
+
+
+def copy_statement(table, columns, format='text'):
+    return 'COPY {0} ({1}) FROM STDIN WITH (FORMAT {2})'.format(
+        quote_name(table), ', '.join(quote_name(column) for column in columns), format)
+
+
+def is_binary(kind):
+    return pa.types.is_binary(kind) or pa.types.is_large_binary(kind) or pa.types.is_fixed_size_binary(kind)
+
+
+def hex_column(column):
+    """A binary column as bytea values in the hex format (\\x0a1b...), with the backslash escaped for the COPY text
+    format. The hex digits of all the values are created at once, and copied into their places with numpy."""
+    column = pc.cast(column, pa.large_binary())
+    offsets = np.frombuffer(column.buffers()[1], dtype=np.int64)[column.offset:column.offset + len(column) + 1]
+    data = column.buffers()[2].to_pybytes()[offsets[0]:offsets[-1]] if column.buffers()[2] else b''
+    offsets = offsets - offsets[0]
+    digits = np.frombuffer(data.hex().encode('ascii'), dtype=np.uint8)
+    new_offsets = 2 * offsets + 3 * np.arange(len(offsets), dtype=np.int64)  # 3: the \\x prefix
+    out = np.empty(int(new_offsets[-1]), dtype=np.uint8)
+    starts = new_offsets[:-1]
+    out[starts[:, None] + np.arange(3)] = np.frombuffer(b'\\\\x', dtype=np.uint8)
+    out[np.arange(len(digits)) + np.repeat(starts + 3 - 2 * offsets[:-1], 2 * np.diff(offsets))] = digits
+    texts = pa.LargeStringArray.from_buffers(len(column), pa.py_buffer(new_offsets), pa.py_buffer(out))
+    return pc.if_else(column.is_valid(), texts, pa.scalar(None, pa.large_string()))
+
+
+def text_column(column):
+    """A column of a record batch as COPY text values (a string array without nulls)."""
+    if pa.types.is_dictionary(column.type):
+        column = column.dictionary_decode()
+    if is_binary(column.type):
+        return pc.fill_null(hex_column(column), '\\N')
+    is_text = pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+    column = pc.cast(column, pa.large_string())
+    if is_text:
+        for old, new in TEXT_ESCAPES:
+            column = pc.replace_substring(column, old, new)
+    return pc.fill_null(column, '\\N')
+
+
+def encode_text(batch):
+    """We encode a record batch in the COPY text format: the columns are joined with tabs and the rows end with a
+    newline, all in Arrow, so the data buffer of the joined array is the encoded batch."""
+    if batch.num_rows == 0:
+        return b''
+    tab, newline, empty = [pa.scalar(text, pa.large_string()) for text in ['\t', '\n', '']]
+    lines = pc.binary_join_element_wise(*[text_column(column) for column in batch.columns], tab)
+    lines = pc.binary_join_element_wise(lines, newline, empty)
+    offsets = np.frombuffer(lines.buffers()[1], dtype=np.int64)[lines.offset:lines.offset + len(lines) + 1]
+    return lines.buffers()[2].to_pybytes()[offsets[0]:offsets[-1]]
+
+
+# the big-endian types of the numpy types that Postgres does not have (smallint, integer, bigint, real)
+BINARY_TYPES = {'i1': '>i2', 'u1': '>i2', 'u2': '>i4', 'u4': '>i8', 'u8': '>i8', 'f2': '>f4'}
+
+
+def timestamp_micros(values):
+    """The microseconds since 1970 of a timestamp array (numpy int64). Nanoseconds are rounded to microseconds, the
+    same way as Postgres rounds them in the text format."""
+    ticks = values.cast(pa.int64()).to_numpy()
+    unit = values.type.unit
+    if unit == 'ns':
+        micros, rest = np.divmod(ticks, 1000)
+        return micros + (rest >= 500)
+    return ticks * {'s': 10 ** 6, 'ms': 10 ** 3, 'us': 1}[unit]
+
+
+def binary_values(column):
+    """The values of a column in the COPY binary format: (lengths, data, data offsets), where lengths is -1 for NULL,
+    and data holds the big-endian bytes of the not null values one after the other."""
+    if pa.types.is_dictionary(column.type):
+        column = column.dictionary_decode()
+    valid = column.drop_null()
+    kind = column.type
+    if pa.types.is_string(kind) or pa.types.is_large_string(kind) or is_binary(kind):
+        valid = pc.cast(valid, pa.large_binary())
+        offsets = np.frombuffer(valid.buffers()[1], dtype=np.int64)[valid.offset:valid.offset + len(valid) + 1]
+        data = np.frombuffer(valid.buffers()[2], dtype=np.uint8) if len(valid) else np.empty(0, np.uint8)
+        sizes = np.diff(offsets)
+        data, offsets = data[offsets[0]:offsets[-1]], offsets - offsets[0]
+    else:
+        if pa.types.is_boolean(kind):
+            values = valid.to_numpy(zero_copy_only=False).astype(np.uint8)
+        elif pa.types.is_timestamp(kind):
+            values = (timestamp_micros(valid) - PG_EPOCH_DAYS * 86400 * 10 ** 6).astype('>i8')
+        elif pa.types.is_date32(kind):
+            values = (valid.cast(pa.int32()).to_numpy() - PG_EPOCH_DAYS).astype('>i4')
+        elif pa.types.is_integer(kind) or pa.types.is_floating(kind):
+            values = valid.to_numpy(zero_copy_only=False)
+            if values.dtype == np.uint64 and len(values) and values.max() > np.iinfo(np.int64).max:
+                raise ValueError('A uint64 value is bigger than the biggest bigint, use the text format (numeric)')
+            # Postgres has no 1-byte integer, half float and unsigned types: they go into the next wider type
+            values = values.astype(BINARY_TYPES.get(values.dtype.str[1:], values.dtype.newbyteorder('>')))
+        else:
+            raise ValueError('The {0} type is not supported in the binary format, use the text format'.format(kind))
+        data = values.view(np.uint8)
+        sizes = np.full(len(values), values.dtype.itemsize, dtype=np.int64)
+        offsets = np.arange(len(values) + 1, dtype=np.int64) * values.dtype.itemsize
+    lengths = np.full(len(column), -1, dtype=np.int64)
+    lengths[column.is_valid().to_numpy(zero_copy_only=False)] = sizes
+    return lengths, data, offsets
+
+
+def encode_binary(batch):
+    """We encode a record batch in the COPY binary format (without the header and the trailer of the stream).
+    We calculate the position of every field from the lengths, and copy the length prefixes and the values of a
+    column into their places with numpy, so there is no Python loop over the rows."""
+    if batch.num_rows == 0:
+        return b''
+    columns = [binary_values(column) for column in batch.columns]
+    field_sizes = [4 + np.maximum(lengths, 0) for lengths, _, _ in columns]
+    row_sizes = 2 + np.sum(field_sizes, axis=0)
+    row_starts = np.concatenate([[0], np.cumsum(row_sizes)[:-1]]).astype(np.int64)
+    out = np.empty(int(row_sizes.sum()), dtype=np.uint8)
+    out[row_starts[:, None] + np.arange(2)] = np.frombuffer(struct.pack('>h', batch.num_columns), np.uint8)
+    field_starts = row_starts + 2
+    for (lengths, data, offsets), sizes in zip(columns, field_sizes):
+        out[field_starts[:, None] + np.arange(4)] = lengths.astype('>i4').view(np.uint8).reshape(-1, 4)
+        value_starts = (field_starts + 4)[lengths >= 0]
+        # every byte of data goes to its value start + its position inside the value
+        out[np.arange(len(data)) + np.repeat(value_starts - offsets[:-1], np.diff(offsets))] = data
+        field_starts = field_starts + sizes
+    return out.tobytes()
+
+
+def encode_batches(batches, format='text'):
+    """We return (yield) the encoded record batches one-by-one, with the header and the trailer of the binary
+    format."""
+    if format == 'binary':
+        yield BINARY_HEADER
+    encode = encode_binary if format == 'binary' else encode_text
+    for batch in batches:
+        yield encode(batch)
+    if format == 'binary':
+        yield BINARY_TRAILER
+
+
+class CopyStream:
+    """A file-like object for cursor.copy_expert(): a background thread encodes the chunks (the next item of the
+    chunks iterator) and passes them through a queue, and read() returns them. At most prefetch chunks can wait in
+    the queue, so the memory usage stays constant, and the next batch is encoded while the previous one is sent."""
+
+    def __init__(self, chunks, prefetch=2):
+        self.chunks = queue.Queue(maxsize=prefetch)
+        self.buffer = b''
+        self.done = False
+        self.error = None
+        self.stopped = False
+        self.thread = threading.Thread(target=self._encode_chunks, args=(chunks,), daemon=True)
+        self.thread.start()
+
+    def _encode_chunks(self, chunks):
+        """The background thread: putting the chunks into the queue, then None."""
+        try:
+            for chunk in chunks:
+                if self.stopped:
+                    break
+                if chunk:
+                    self.chunks.put(chunk)
+        except Exception as error:  # it is raised in read(), so COPY fails instead of loading partial data
+            self.error = error
+        finally:
+            self.chunks.put(None)
+
+    def read(self, size=-1):
+        """Returning at most size bytes (everything if size is negative), b'' at the end of the stream."""
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(2 ** 30), b''))
+        while not self.buffer and not self.done:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.done = True
+                if self.error is not None:
+                    raise self.error
+            else:
+                self.buffer = memoryview(chunk)
+        data, self.buffer = bytes(self.buffer[:size]), self.buffer[size:]
+        return data
+
+    def close(self):
+        """Stopping the background thread (if the COPY failed before reading everything)."""
+        self.stopped = True
+        while not self.done:
+            self.done = self.chunks.get() is None
+        self.thread.join()
+
+
+def copy_batches(conn, batches, table, columns, format='text', prefetch=2, buffer_bytes=1024 ** 2):
+    """We load the record batches (all with the given column names) into the table with one COPY statement, and
+    return the number of rows. The transaction is not committed, that is the job of the caller."""
+    rows = [0]
+
+    def counted(batches):
+        for batch in batches:
+            rows[0] += batch.num_rows
+            yield batch
+
+    stream = CopyStream(encode_batches(counted(batches), format), prefetch)
+    try:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(copy_statement(table, columns, format), stream, size=buffer_bytes)
+    finally:
+        stream.close()
+    return rows[0]
+
+
+def copy_parquet(conn, path, table, columns=None, format='text', batch_size=65536, prefetch=2, commit=True):
+    """We load a parquet file (only the given columns, or all of them) into the table (the column names must be the
+    same) batch-by-batch with COPY, and commit the transaction (unless commit is False). It returns the number of
+    rows. For example:
+        conn = create_conn_from_config()
+        copy_parquet(conn, '../data/opfcp.parquet', 'opfcp', format='binary')
+    """
+    pf = pq.ParquetFile(path, memory_map=True)
+    try:
+        columns = columns or pf.schema_arrow.names
+        rows = copy_batches(conn, pf.iter_batches(batch_size=batch_size, columns=columns), table, columns, format,
+                            prefetch)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pf.close()
+    if commit:
+        conn.commit()
+    return rows
+
+
+# ********** Writing a dataframe into a table
+
+# write_frame() writes a pandas dataframe into an existing table (the dataframe columns are the table columns), in
+# chunks of chunk_rows rows, so only one chunk is converted at a time (into an Arrow record batch):
+#   mode='append': the rows are loaded with COPY (copy_batches())
+#   mode='upsert': the rows are inserted, and the rows that already exist (the same key columns, there must be a
+#                  unique constraint on them) are updated: INSERT ... ON CONFLICT (key) DO UPDATE SET ...
+#       method='staging': the rows are loaded with COPY into a temporary table first, then inserted with one
+#                         INSERT ... SELECT statement (fastest for many rows)
+#       method='values':  execute_values() sends page_size rows in one INSERT ... VALUES statement
+#   The dataframe must not contain a key twice, Postgres cannot update the same row twice in one statement.
+# If the connection has no open transaction, write_frame() commits at the end (or rolls back on error). If the caller
+# has an open transaction, write_frame() works in it inside a savepoint: on error only the changes of write_frame()
+# are rolled back, and committing is the job of the caller.
+
+def frame_batches(df, chunk_rows=100000):
+    """We return (yield) the dataframe as Arrow record batches of chunk_rows rows."""
+    for start in range(0, len(df), chunk_rows):
+        yield pa.RecordBatch.from_pandas(df.iloc[start:start + chunk_rows], preserve_index=False)
+
+
+def upsert_statement(table, columns, key, source):
+    """INSERT INTO table (columns) source ON CONFLICT (key) DO UPDATE SET (the not key columns)"""
+    updates = [quote_name(column) for column in columns if column not in key]
+    if updates:
+        action = 'DO UPDATE SET ' + ', '.join('{0} = EXCLUDED.{0}'.format(column) for column in updates)
+    else:
+        action = 'DO NOTHING'
+    return 'INSERT INTO {0} ({1}) {2} ON CONFLICT ({3}) {4}'.format(
+        quote_name(table), ', '.join(quote_name(column) for column in columns), source,
+        ', '.join(quote_name(column) for column in key), action)
+
+
+def upsert_staging(conn, batches, table, columns, key, format):
+    staging = 'write_frame_{0}'.format(uuid.uuid4().hex)
+    with conn.cursor() as cursor:
+        cursor.execute('CREATE TEMPORARY TABLE {0} (LIKE {1} INCLUDING DEFAULTS)'.format(
+            quote_name(staging), quote_name(table)))
+    copy_batches(conn, batches, staging, columns, format)
+    with conn.cursor() as cursor:
+        cursor.execute(upsert_statement(table, columns, key, 'SELECT {0} FROM {1}'.format(
+            ', '.join(quote_name(column) for column in columns), quote_name(staging))))
+        cursor.execute('DROP TABLE {0}'.format(quote_name(staging)))
+
+
+def upsert_values(conn, batches, table, columns, key, page_size):
+    statement = upsert_statement(table, columns, key, 'VALUES %s')
+    with conn.cursor() as cursor:
+        for batch in batches:
+            # to_pylist() gives None for the missing values (NaN, NaT, pd.NA)
+            rows = list(zip(*[column.to_pylist() for column in batch.columns]))
+            execute_values(cursor, statement, rows, page_size=page_size)
+
+
+def write_frame(conn, df, table, mode='append', key=None, method='staging', chunk_rows=100000, page_size=1000,
+                format='text'):
+    """We write the dataframe into the table (see above) and return the number of rows written.
+    key is the list of the key columns for mode='upsert'."""
+    if mode not in ('append', 'upsert'):
+        raise ValueError("Unknown mode: {0} (use 'append' or 'upsert')".format(mode))
+    if mode == 'upsert' and not key:
+        raise ValueError('The key columns are needed for upsert')
+    key = [key] if isinstance(key, str) else key
+    columns = [str(column) for column in df.columns]
+    batches = frame_batches(df, chunk_rows)
+    own_transaction = conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+    if not own_transaction:
+        with conn.cursor() as cursor:
+            cursor.execute('SAVEPOINT write_frame')
+    try:
+        if mode == 'append':
+            copy_batches(conn, batches, table, columns, format)
+        elif method == 'staging':
+            upsert_staging(conn, batches, table, columns, key, format)
+        else:
+            upsert_values(conn, batches, table, columns, key, page_size)
+    except Exception:
+        if own_transaction:
+            conn.rollback()
+        else:
+            with conn.cursor() as cursor:
+                cursor.execute('ROLLBACK TO SAVEPOINT write_frame')
+        raise
+    if own_transaction:
+        conn.commit()
+    else:
+        with conn.cursor() as cursor:
+            cursor.execute('RELEASE SAVEPOINT write_frame')
+    return len(df)
@@ -0,0 +1,224 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import monotonic
+
+import psycopg2 as ps
+
+from db.postgres import read_config
+
+
+# https://www.psycopg.org/docs/pool.html (psycopg2's own simple pools, without health check and recycling)
+# https://www.psycopg.org/docs/connection.html#connection.closed
+# https://docs.python.org/3/library/threading.html#condition-objects
+
+
+# ********** Connection pool
+
+# create_conn_from_config() opens a new connection for every call, and main() closes it at the end. Opening a
+# connection (TCP, authentication, a new server process) can take longer than the query itself. A pool keeps the
+# connections open and lends them to the threads:
+#   - at least min_size connections are kept open, at most max_size are open at the same time; if all of them are in
+#     use, getconn() waits (at most timeout seconds) until one is given back
+#   - a connection is checked (select 1) when it is taken out of the pool, a broken one is replaced by a new one
+#   - a connection is closed after max_lifetime seconds, and also after max_idle seconds without use if there are more
+#     than min_size connections; all the idle connections are checked at every checkout and checkin
+#   - stats() returns the metrics: checkouts per second, the waiting times, the number of connections in use
+# Usage:
+#   pool = get_pool()  # one pool per config file and section
+#   with pool.connection() as conn:
+#       cursor = conn.cursor()
+#       ...
+#       conn.commit()
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """A thread-safe connection pool. connect is the function that opens a new connection."""
+
+    def __init__(self, connect, min_size=1, max_size=10, max_idle=600, max_lifetime=3600, timeout=30,
+                 check_query='select 1'):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check_query = check_query
+        self.condition = threading.Condition()
+        self.idle = deque()      # (connection, created, last used), the most recently used at the right end
+        self.created = {}        # id(connection) -> created, for all the open connections
+        self.opening = 0         # connections being opened (their place is reserved)
+        self.closed = False
+        self.started = monotonic()
+        self.metrics = {'checkouts': 0, 'wait_secs': 0.0, 'max_wait_secs': 0.0, 'timeouts': 0, 'opened': 0,
+                        'recycled': 0, 'failed_checks': 0}
+        for _ in range(min_size):
+            self._add_idle(self._open())
+
+    def _open(self):
+        conn = self.connect()
+        with self.condition:
+            self.created[id(conn)] = monotonic()
+            self.metrics['opened'] += 1
+        return conn
+
+    def _add_idle(self, conn):
+        with self.condition:
+            self.idle.append((conn, self.created[id(conn)], monotonic()))
+            self.condition.notify()
+
+    def _discard(self, conn):
+        """Closing a connection and freeing its place in the pool."""
+        with self.condition:
+            self.created.pop(id(conn), None)
+            self.condition.notify()
+        self._close_all([conn])
+
+    def _expired(self, created, last_used, now):
+        return (now - created > self.max_lifetime
+                or (now - last_used > self.max_idle and len(self.created) + self.opening > self.min_size))
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(self.check_query)
+            conn.rollback()  # the check must not leave a transaction open
+            return True
+        except Exception:
+            return False
+
+    def _sweep(self):
+        """Taking the expired connections out of the idle ones (the lock must be held). They are returned, so that
+        they can be closed outside of the lock."""
+        now = monotonic()
+        expired = []
+        for entry in list(self.idle):
+            conn, created, last_used = entry
+            if self._expired(created, last_used, now):
+                self.idle.remove(entry)
+                self.created.pop(id(conn), None)
+                self.metrics['recycled'] += 1
+                expired.append(conn)
+        if expired:
+            self.condition.notify(len(expired))
+        return expired
+
+    def _close_all(self, connections):
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def getconn(self):
+        """Taking a connection from the pool (or opening a new one if there is room). It raises PoolTimeout if there
+        is no free connection in timeout seconds."""
+        start = monotonic()
+        while True:
+            expired = []
+            with self.condition:
+                while True:
+                    if self.closed:
+                        self._close_all(expired)
+                        raise PoolTimeout('The pool is closed')
+                    expired += self._sweep()
+                    if self.idle:
+                        conn = self.idle.pop()[0]
+                        break
+                    if len(self.created) + self.opening < self.max_size:
+                        self.opening += 1
+                        conn = None
+                        break
+                    remaining = self.timeout - (monotonic() - start)
+                    if remaining <= 0:
+                        self.metrics['timeouts'] += 1
+                        self._close_all(expired)
+                        raise PoolTimeout('No free connection in {0} seconds'.format(self.timeout))
+                    self.condition.wait(remaining)
+            self._close_all(expired)  # outside of the lock
+            if conn is None:  # opening a new one, outside of the lock
+                try:
+                    conn = self._open()
+                finally:
+                    with self.condition:
+                        self.opening -= 1
+                        self.condition.notify()
+            elif not self._is_healthy(conn):
+                with self.condition:
+                    self.metrics['failed_checks'] += 1
+                self._discard(conn)
+                continue
+            with self.condition:
+                wait = monotonic() - start
+                self.metrics['checkouts'] += 1
+                self.metrics['wait_secs'] += wait
+                self.metrics['max_wait_secs'] = max(self.metrics['max_wait_secs'], wait)
+            return conn
+
+    def putconn(self, conn):
+        """Giving back a connection. An open transaction is rolled back, a broken connection is closed. The expired
+        idle connections are closed too."""
+        if self.closed or conn.closed:
+            self._discard(conn)
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self.condition:
+            self.idle.append((conn, self.created[id(conn)], monotonic()))
+            self.condition.notify()
+            expired = self._sweep()
+        self._close_all(expired)
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self):
+        with self.condition:
+            stats = dict(self.metrics)
+            stats['open'] = len(self.created)
+            stats['idle'] = len(self.idle)
+            stats['in_use'] = len(self.created) - len(self.idle)
+            stats['checkouts_per_sec'] = stats['checkouts'] / max(monotonic() - self.started, 1e-9)
+            stats['avg_wait_secs'] = stats['wait_secs'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+    def close(self):
+        """Closing the idle connections; the ones in use are closed when they are given back."""
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, deque()
+            self.condition.notify_all()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(filename='database.ini', section='postgresql', **pool_options):
+    """Returning the pool of the config file section (it is created at the first call, with the pool_options)."""
+    with pools_lock:
+        if (filename, section) not in pools:
+            params = read_config(filename, section)
+            pools[(filename, section)] = ConnectionPool(lambda: ps.connect(**params), **pool_options)
+        return pools[(filename, section)]
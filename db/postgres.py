@@ -1,12 +1,15 @@
 import pandas as pd
 import psycopg2 as ps
 from configparser import ConfigParser
+from functools import lru_cache
 
 
 # https://www.postgresqltutorial.com/postgresql-python/
 # There is a nice example for an iterator function to return query result:
 # "Querying data using fetchmany() method" section at: https://www.postgresqltutorial.com/postgresql-python/query/
 # It is basically the same that I showed in file_management/read_write_files.py
+# For loading a lot of rows (for example a parquet file), see copy_parquet() in db/bulk_load.py: it uses COPY instead of
+# one INSERT per row.
 
 
 def create_connection(user='postgres', password='admin', host='127.0.0.1', port='5432', database='dvdrental'):
@@ -14,8 +17,10 @@ def create_connection(user='postgres', password='admin', host='127.0.0.1', port=
     return conn
 
 
-def create_conn_from_config(filename='database.ini', section='postgresql'):
-    # Reading the config
+@lru_cache(maxsize=None)
+def parse_config(filename='database.ini', section='postgresql'):
+    """Reading the connection parameters from the config file. The parsed config is cached, the file is read only at
+    the first call (parse_config.cache_clear() forgets it, for example if the file has changed)."""
     parser = ConfigParser()
     parser.read(filename)
     # Creating a set for the parameters
@@ -26,8 +31,20 @@ def create_conn_from_config(filename='database.ini', section='postgresql'):
             db[param[0]] = param[1]
     else:
         raise Exception('Section {0} not found in the {1} file'.format(section, filename))
+    return db
+
+
+def read_config(filename='database.ini', section='postgresql'):
+    """The connection parameters (a copy of the cached config, so the caller can change it)."""
+    return dict(parse_config(filename, section))
+
+
+def create_conn_from_config(filename='database.ini', section='postgresql'):
+    # Reading the config (only once, see parse_config())
+    db = read_config(filename, section)
 
     # Creating the connection to Postgres
+    # A new connection for every request is slow, db/pool.py has a connection pool that reuses them
     conn = ps.connect(**db)
     return conn
 
@@ -87,8 +104,12 @@ def main():
                                       chunksize=None  # if the result set is big, we can use chunks, as seen before
                                       )
         print(df_cities.head())
+        # For queries that are run again and again (reference data) see QueryCache in db/query_cache.py
+        # For really big results see stream_query() in db/streaming.py: it uses a server-side cursor and returns the
+        # result in dataframe chunks, without getting all the rows at once.
 
         # DML statement
+        # For writing a whole dataframe (append or upsert) see write_frame() in db/bulk_load.py
 
         cursor.execute("""delete from country  where country = 'Empire of NRPS' """)
         print('Deleted {0} record(s)'.format(cursor.rowcount))
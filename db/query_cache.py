@@ -0,0 +1,224 @@
+import json
+import os
+import pickle
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from time import monotonic
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from file_management.df_csv_cache import arrow_table, normalize_option
+
+
+# https://arrow.apache.org/docs/python/feather.html
+# https://docs.python.org/3/library/collections.html#collections.OrderedDict.move_to_end
+
+
+# ********** Caching query results
+
+# The same reference queries (select city_id, city, country_id from city) are run again and again, and the result is
+# the same until somebody changes the table. QueryCache keeps the results in memory:
+#   - dataframes as pyarrow Tables (columnar, smaller than an object dataframe), if the dataframe comes back the same
+#     from Arrow; otherwise (for example a column of dictionaries) pickled, like the row lists of fetchall()
+#   - the key is the normalized SQL (the same query with other whitespace or upper/lower case keywords is the same key,
+#     but the string literals and the quoted names are kept as they are) plus the parameters (and the read options)
+#   - an entry expires after ttl seconds
+#   - if the entries are bigger than max_bytes, the least recently used ones are evicted; with a spill_dir they are
+#     written there first (Arrow Tables as Feather files, loaded by memory mapping; at most max_spill_bytes on disk)
+#   - invalidate('city') drops the results that read the city table (the tables are found after FROM and JOIN, or
+#     they can be given with tables=[...]); execute() runs a DML statement and invalidates the table it changes
+#   - stats() returns the hits, the misses and the other counters
+# Usage:
+#   cache = QueryCache(ttl=300)
+#   df_cities = cache.read_sql_query('select city_id, city, country_id from city', conn, index_col=['city_id'])
+#   cache.execute(cursor, "insert into city (city, country_id) values (%s, %s)", ('Szeged', 46))  # invalidates city
+
+QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+NAME = r'((?:"(?:[^"]|"")*"|[\w$]+)(?:\.(?:"(?:[^"]|"")*"|[\w$]+))?)'  # a table name, maybe with schema and quotes
+READ_TABLES = re.compile(r'\b(?:from|join)\s+(?:only\s+|lateral\s+)?' + NAME)
+WRITTEN_TABLE = re.compile(r'^(?:insert\s+into|update|delete\s+from|truncate(?:\s+table)?|alter\s+table|'
+                           r'drop\s+table(?:\s+if\s+exists)?)\s+(?:only\s+)?' + NAME)
+
+
+def normalize_sql(sql):
+    """Lower case and single spaces outside of the string literals and the quoted names, without a closing ;"""
+    parts = QUOTED.split(sql.strip().rstrip(';').strip())
+    return ''.join(part if i % 2 else re.sub(r'\s+', ' ', part.lower()) for i, part in enumerate(parts))
+
+
+def table_name(name):
+    """The name of a table without the schema and the quotes (not quoted names are lower case), for example
+    public.City -> city, "City" -> City."""
+    name = QUOTED.split(name)[-2] if name.endswith('"') else name.split('.')[-1]
+    return name[1:-1].replace('""', '"') if name.startswith('"') else name.lower()
+
+
+def read_tables(sql):
+    return {table_name(name) for name in READ_TABLES.findall(normalize_sql(sql))}
+
+
+def written_table(sql):
+    found = WRITTEN_TABLE.match(normalize_sql(sql))
+    return table_name(found.group(1)) if found else None
+
+
+def frame_value(df):
+    """The cached form of a dataframe: a pyarrow Table if the dataframe comes back from it with the same values and
+    data types (see arrow_table), otherwise the pickled dataframe."""
+    table = arrow_table(df)
+    if table is not None:
+        return table
+    return pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class QueryCache:
+    """A thread-safe cache of query results (see above)."""
+
+    def __init__(self, ttl=60, max_bytes=256 * 1024 ** 2, spill_dir=None, max_spill_bytes=1024 ** 3):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.entries = OrderedDict()  # key -> entry dictionary, the least recently used first
+        self.lock = threading.Lock()
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0, 'spilled': 0, 'invalidated': 0}
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def key(self, kind, sql, params, options=None):
+        return json.dumps([kind, normalize_sql(sql), normalize_option(params), normalize_option(options or {})])
+
+    def _remove(self, key, counter):
+        entry = self.entries.pop(key)
+        self.counters[counter] += 1
+        if entry['path']:
+            self.spilled_bytes -= entry['nbytes']
+            os.remove(entry['path'])
+        else:
+            self.memory_bytes -= entry['nbytes']
+
+    def get(self, key):
+        """The cached value of the key (a pyarrow Table or pickled bytes), or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and monotonic() > entry['expires']:
+                self._remove(key, 'expired')
+                entry = None
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['hits'] += 1
+            self.entries.move_to_end(key)
+            if entry['path'] and entry['arrow']:
+                return feather.read_table(entry['path'], memory_map=True)
+            if entry['path']:
+                with open(entry['path'], 'rb') as fp:
+                    return fp.read()
+            return entry['value']
+
+    def put(self, key, value, tables):
+        """Caching a value (a pyarrow Table or pickled bytes) of the key, which reads the tables."""
+        arrow = isinstance(value, pa.Table)
+        nbytes = value.nbytes if arrow else len(value)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key, 'evicted')
+            self.entries[key] = {'value': value, 'arrow': arrow, 'path': None, 'nbytes': nbytes, 'tables': tables,
+                                 'expires': monotonic() + self.ttl}
+            self.memory_bytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        """Moving the least recently used entries to the disk (or dropping them) while the memory is over max_bytes,
+        then deleting the least recently used files while the disk is over max_spill_bytes."""
+        for key in list(self.entries):
+            if self.memory_bytes <= self.max_bytes:
+                break
+            entry = self.entries[key]
+            if entry['path']:
+                continue
+            if not self.spill_dir:
+                self._remove(key, 'evicted')
+                continue
+            extension = 'arrow' if entry['arrow'] else 'pickle'
+            path = os.path.join(self.spill_dir, '{0}.{1}'.format(uuid.uuid4().hex, extension))
+            if entry['arrow']:
+                # not compressed, so that it can be memory mapped without decompressing it
+                feather.write_feather(entry['value'], path, compression='uncompressed')
+            else:
+                with open(path, 'wb') as fp:
+                    fp.write(entry['value'])
+            entry['value'], entry['path'] = None, path
+            self.memory_bytes -= entry['nbytes']
+            self.spilled_bytes += entry['nbytes']
+            self.counters['spilled'] += 1
+        for key in list(self.entries):
+            if self.spilled_bytes <= self.max_spill_bytes:
+                break
+            if self.entries[key]['path']:
+                self._remove(key, 'evicted')
+
+    def invalidate(self, table=None):
+        """Dropping the results that read the table (all the results if table is None)."""
+        with self.lock:
+            for key in [key for key, entry in self.entries.items()
+                        if table is None or table_name(table) in entry['tables']]:
+                self._remove(key, 'invalidated')
+
+    def read_sql_query(self, sql, conn, params=None, tables=None, **read_options):
+        """The same as pd.read_sql_query(sql, conn, params=params, **read_options), but the result comes from the
+        cache if possible. tables: the tables that the query reads (by default they are found in the SQL).
+        A hit and a miss return the same dataframe (a new one every time, so the caller can change it)."""
+        if read_options.get('chunksize'):
+            return pd.read_sql_query(sql, conn, params=params, **read_options)
+        key = self.key('frame', sql, params, read_options)
+        value = self.get(key)
+        if value is None:
+            df = pd.read_sql_query(sql, conn, params=params, **read_options)
+            value = frame_value(df)
+            self.put(key, value, set(tables or read_tables(sql)))
+            if not isinstance(value, pa.Table):
+                return df
+        return value.to_pandas() if isinstance(value, pa.Table) else pickle.loads(value)
+
+    def fetchall(self, cursor, sql, params=None, tables=None):
+        """The same as cursor.execute(sql, params) and cursor.fetchall(), a list of tuples, but the result comes from
+        the cache if possible (pickled, so a hit returns the same values as a miss). A statement without a result
+        (cursor.description is None) is not cached, it invalidates the table that it changes, and returns []."""
+        key = self.key('rows', sql, params)
+        value = self.get(key)
+        if value is not None:
+            return pickle.loads(value)
+        cursor.execute(sql, params)
+        if cursor.description is None:
+            self.invalidate(written_table(sql))
+            return []
+        rows = cursor.fetchall()
+        self.put(key, pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL), set(tables or read_tables(sql)))
+        return rows
+
+    def execute(self, cursor, sql, params=None):
+        """Running a DML (or DDL) statement and invalidating the results of the table that it changes (all the results
+        if the table is not found in the statement)."""
+        cursor.execute(sql, params)
+        table = written_table(sql)
+        self.invalidate(table)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.entries)
+            stats['memory_bytes'] = self.memory_bytes
+            stats['spilled_bytes'] = self.spilled_bytes
+            requests = stats['hits'] + stats['misses']
+            stats['hit_ratio'] = stats['hits'] / requests if requests else 0.0
+        return stats
+
+    def clear(self):
+        self.invalidate()
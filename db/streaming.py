@@ -0,0 +1,106 @@
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from file_management.parquet_read import arrow_type, typed_to_pandas
+
+
+# https://www.psycopg.org/docs/usage.html#server-side-cursors
+# https://www.psycopg.org/docs/cursor.html#cursor.itersize
+# https://www.psycopg.org/docs/cursor.html#cursor.fetchmany
+# https://www.psycopg.org/docs/cursor.html#cursor.description
+# https://www.postgresql.org/docs/current/catalog-pg-type.html (the type oids)
+
+
+# ********** Streaming a big query result in chunks
+
+# cursor.fetchall() and pd.read_sql_query() (even with chunksize) get the whole result from the server first: a normal
+# (client-side) psycopg2 cursor receives all the rows when the query is executed. A named cursor is a server-side
+# cursor (DECLARE ... CURSOR): the rows stay on the server, and fetchmany(n) gets the next n rows only.
+# stream_query() returns the result in chunks of chunk_rows rows, as pandas dataframes or pyarrow Tables, with the
+# data types of dtypes (like read_pandas_typed() in file_management/parquet_read.py). Every chunk has the same types:
+# the type of a column comes from dtypes, or from its Postgres type (cursor.description), or else from the first chunk
+# that has a value in it (an all-NULL chunk would have the null type otherwise). The next chunks (at most
+# prefetch) are fetched and converted in a background thread while the caller processes the current one, so the
+# memory usage depends on the chunk size, not on the size of the result.
+# A named cursor works only inside a transaction, so the connection must not be in autocommit mode. For example:
+#   for chunk in stream_query(conn, 'select * from rental', chunk_rows=100000, dtypes={'staff_id': 'int8'}):
+#       ...
+
+# the pyarrow types of the Postgres type oids (the type_code in cursor.description) that psycopg2 returns as
+# Python values of the same kind; the others (for example numeric) are inferred from the values
+POSTGRES_TYPES = {16: pa.bool_(), 17: pa.binary(), 20: pa.int64(), 21: pa.int16(), 23: pa.int32(), 25: pa.string(),
+                  700: pa.float32(), 701: pa.float64(), 1042: pa.string(), 1043: pa.string(), 1082: pa.date32(),
+                  1114: pa.timestamp('us'), 1184: pa.timestamp('us', tz='UTC')}
+
+
+def column_types(description, dtypes=None):
+    """The pyarrow type of every column of the result (column name -> type), from dtypes (the type of the values for
+    'category') or from the Postgres type; None if it is not known yet."""
+    dtypes = dtypes or {}
+    types = {}
+    for column in description:
+        name, type_code = column[0], column[1] if len(column) > 1 else None
+        dtype = dtypes.get(name)
+        types[name] = (arrow_type(dtype) if dtype is not None and dtype != 'category'
+                       else POSTGRES_TYPES.get(type_code))
+    return types
+
+
+def rows_to_table(rows, names, dtypes=None, types=None):
+    """Converting a list of row tuples into a pyarrow Table, with the pyarrow types of dtypes (column name -> pandas
+    data type, 'category' is dictionary encoded) or of types (column name -> pyarrow type)."""
+    dtypes = dtypes or {}
+    types = types or {}
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    arrays = []
+    for name, values in zip(names, columns):
+        dtype = dtypes.get(name)
+        if dtype == 'category':
+            arrays.append(pc.dictionary_encode(pa.array(values, type=types.get(name))))
+        else:
+            arrays.append(pa.array(values, type=arrow_type(dtype) if dtype is not None else types.get(name)))
+    return pa.table(arrays, names=names)
+
+
+def stream_query(conn, query, params=None, chunk_rows=50000, dtypes=None, to_arrow=False, prefetch=1):
+    """We run the query with a named (server-side) cursor, and return (yield) the result chunk-by-chunk (at most
+    chunk_rows rows each) as pandas dataframes (or pyarrow Tables if to_arrow is True)."""
+    cursor = conn.cursor(name='stream_{0}'.format(uuid.uuid4().hex))
+    cursor.itersize = chunk_rows  # used if the cursor is iterated directly
+    in_progress = deque()
+    types = {}
+
+    def fetch_chunk():
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return None
+        if not types:
+            types.update(column_types(cursor.description, dtypes))
+        table = rows_to_table(rows, [column[0] for column in cursor.description], dtypes, types)
+        for name, column_type in zip(table.column_names, table.schema.types):  # the inferred types are kept
+            column_type = column_type.value_type if pa.types.is_dictionary(column_type) else column_type
+            if types[name] is None and not pa.types.is_null(column_type):
+                types[name] = column_type
+        return table if to_arrow else typed_to_pandas(table, dtypes or {})
+
+    try:
+        cursor.execute(query, params)
+        # one thread: the chunks must be fetched one after the other, but not by the thread that processes them
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            try:
+                while True:
+                    while len(in_progress) <= prefetch:
+                        in_progress.append(executor.submit(fetch_chunk))
+                    chunk = in_progress.popleft().result()
+                    if chunk is None:
+                        break
+                    yield chunk
+            finally:
+                for future in in_progress:  # if the loop of the caller stopped early
+                    future.cancel()
+    finally:
+        cursor.close()  # after the executor has finished the running fetch
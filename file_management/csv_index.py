@@ -0,0 +1,132 @@
+import io
+import json
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+from file_management.read_write_files import find_line_end, split_csv_ranges
+
+
+# Reading only a range of a key column (for example one hour of tpep_pickup_datetime) from a huge csv file.
+# build_index() goes through the file once and saves a sidecar index next to it (file_name + '.index.json'): for every
+# block of block_rows lines the byte range of the block and the minimum and maximum of the key column in it.
+# read_range() reads only the blocks whose [minimum, maximum] overlaps the requested range. It works best if the file is
+# (more or less) sorted by the key, because then only a few blocks contain a given range.
+# The index contains the size and the modification time of the file; if they change, the index is built again.
+
+
+def line_ends(data, start, end):
+    """This function returns the positions after the ends of the csv lines between start and end (a numpy array).
+    A line break inside a quoted field is not the end of a line (there is an odd number of quotes before it)."""
+    buffer = np.frombuffer(data[start:end], dtype=np.uint8)
+    quotes = np.cumsum(buffer == ord('"'))
+    ends = np.flatnonzero((buffer == ord('\n')) & (quotes % 2 == 0)) + start + 1
+    if end > start and buffer[-1] != ord('\n'):  # the last line of the file without a line break
+        ends = np.append(ends, end)
+    return ends
+
+
+def parse_keys(values):
+    """The key values are compared as dates if they are texts that can be parsed as dates."""
+    if values.dtype == object or pd.api.types.is_string_dtype(values):
+        return pd.to_datetime(values, errors='coerce'), 'datetime'
+    return values, 'number'
+
+
+def to_json_value(value, key_type):
+    if pd.isna(value):
+        return None
+    return value.isoformat() if key_type == 'datetime' else value.item() if hasattr(value, 'item') else value
+
+
+def from_json_value(value, key_type):
+    return pd.Timestamp(value) if key_type == 'datetime' and value is not None else value
+
+
+def file_identity(file_name):
+    stat = os.stat(file_name)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def build_index(file_name, key, block_rows=10000, index_file=None, chunk_bytes=16 * 1024 * 1024):
+    """We build the index of the file for the key column and save it into index_file (file_name + '.index.json' by
+    default). The index is a dictionary, which is also returned."""
+    index_file = index_file or str(file_name) + '.index.json'
+    identity = file_identity(file_name)
+    blocks, key_type = [], 'number'
+    with open(file_name, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header_end = find_line_end(data, 0)
+        header = pd.read_csv(io.BytesIO(data[:header_end]), nrows=0).columns.tolist()
+        block_start = header_end
+        pending_ends, pending_keys = np.empty(0, dtype=np.int64), pd.Series([], dtype=object)
+        for start, end in split_csv_ranges(data, header_end, chunk_bytes):
+            ends = line_ends(data, start, end)
+            # skip_blank_lines=False: an empty line is a row with missing values, so there is a key for every line
+            keys = pd.read_csv(io.BytesIO(data[start:end]), header=None, names=header, usecols=[key],
+                               skip_blank_lines=False)[key]
+            keys, key_type = parse_keys(keys)
+            pending_ends = np.concatenate([pending_ends, ends])
+            pending_keys = pd.concat([pending_keys, keys], ignore_index=True) if len(pending_keys) else keys
+            while len(pending_ends) >= block_rows:
+                block_end = int(pending_ends[block_rows - 1])
+                block_keys = pending_keys.iloc[:block_rows]
+                blocks.append([block_start, block_end, to_json_value(block_keys.min(), key_type),
+                               to_json_value(block_keys.max(), key_type), block_rows])
+                block_start = block_end
+                pending_ends = pending_ends[block_rows:]
+                pending_keys = pending_keys.iloc[block_rows:].reset_index(drop=True)
+        if len(pending_ends):
+            blocks.append([block_start, int(pending_ends[-1]), to_json_value(pending_keys.min(), key_type),
+                           to_json_value(pending_keys.max(), key_type), len(pending_ends)])
+    index = {'file': identity, 'key': key, 'key_type': key_type, 'header_end': header_end,
+             'block_rows': block_rows, 'blocks': blocks}
+    with open(index_file + '.tmp', 'wt', encoding='utf8') as fp:
+        json.dump(index, fp)
+    os.replace(index_file + '.tmp', index_file)
+    return index
+
+
+def load_index(file_name, key, block_rows=10000, index_file=None):
+    """This function loads the index of the file, or builds it if it does not exist, it is for another key column, or
+    the file has changed since the index was built."""
+    index_file = index_file or str(file_name) + '.index.json'
+    try:
+        with open(index_file, 'rt', encoding='utf8') as fp:
+            index = json.load(fp)
+        if index['file'] == file_identity(file_name) and index['key'] == key:
+            return index
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    return build_index(file_name, key, block_rows, index_file)
+
+
+def read_range(file_name, key, low, high, block_rows=10000, index_file=None, **read_options):
+    """We read the rows of the file where low <= key < high into a dataframe (the read_options are passed to
+    pd.read_csv). Only the blocks of the index that can contain such rows are read."""
+    index = load_index(file_name, key, block_rows, index_file)
+    low, high = from_json_value(low, index['key_type']), from_json_value(high, index['key_type'])
+    spans = []  # the byte ranges to read; neighbouring blocks are merged
+    for start, end, minimum, maximum, _ in index['blocks']:
+        if minimum is None or from_json_value(maximum, index['key_type']) < low or \
+                from_json_value(minimum, index['key_type']) >= high:
+            continue
+        if spans and spans[-1][1] == start:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+    with open(file_name, 'rb') as fp:
+        header = fp.read(index['header_end'])
+        parts = []
+        for start, end in spans:
+            fp.seek(start)
+            parts.append(fp.read(end - start))
+    df = pd.read_csv(io.BytesIO(header + b''.join(parts)), **read_options)
+    keys = parse_keys(df[key])[0] if index['key_type'] == 'datetime' else df[key]
+    return df[(keys >= low) & (keys < high)]
+
+
+if __name__ == "__main__":
+    print(read_range('../data/taxi.csv', 'tpep_pickup_datetime', '2018-10-31 07:00:00', '2018-10-31 08:00:00',
+                     block_rows=1000))
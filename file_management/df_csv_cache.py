@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+# https://arrow.apache.org/docs/python/feather.html
+# https://arrow.apache.org/docs/python/ipc.html
+# https://arrow.apache.org/docs/python/memory.html#memory-mapped-files
+
+# Reading the same csv (or zipped csv) file with the same options again and again means decompressing and parsing the
+# same text every time. read_csv_cached() stores the parsed dataframe in a cache directory as an uncompressed Arrow IPC
+# (Feather) file, and the next time it only memory maps that file.
+# The cache key is the hash of the file content plus the read_csv options, so a copied or touched file with the same
+# content is still found in the cache. The content hash is remembered per path, size and modification time, so the file
+# is only hashed again if it changed. If the cache is bigger than max_bytes, the least recently used entries are
+# deleted.
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'read_csv_cache')
+
+
+def file_hash(file_name, block_size=1024 * 1024):
+    """This function returns the hash of the content of a file."""
+    content_hash = hashlib.blake2b()
+    with open(file_name, 'rb') as fp:
+        for block in iter(lambda: fp.read(block_size), b''):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def normalize_option(value):
+    """This function converts a read_csv option value into something that can be put into json, the same way for
+    equal options (for example np.int32, 'int32' and np.dtype('int32') are all 'int32')."""
+    if isinstance(value, dict):
+        return {str(key): normalize_option(item) for key, item in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [normalize_option(item) for item in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    try:
+        return np.dtype(value).name
+    except TypeError:
+        return str(value)
+
+
+def has_function(value):
+    """True if the option value is a function or contains one (for example converters={'a': func}). A function has
+    no stable key: str(func) contains its memory address."""
+    if isinstance(value, dict):
+        return any(has_function(item) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return any(has_function(item) for item in value)
+    return callable(value) and not isinstance(value, type)
+
+
+def is_cacheable(read_options):
+    """Functions (for example a date_parser or converters) and chunked reading cannot be cached."""
+    if read_options.get('chunksize') or read_options.get('iterator'):
+        return False
+    return not any(has_function(value) for value in read_options.values())
+
+
+def arrow_table(df):
+    """The pyarrow Table of a dataframe if the dataframe comes back from it with the same values, data types and index,
+    otherwise None (for example a column of datetime objects comes back as datetime64)."""
+    try:
+        table = pa.Table.from_pandas(df)
+        back = table.to_pandas()
+        if back.equals(df) and back.dtypes.equals(df.dtypes) and back.index.equals(df.index):
+            return table
+    except (pa.ArrowException, TypeError, ValueError):
+        pass
+    return None
+
+
+def touch(path):
+    """The modification time of a cache entry is its last use (for the LRU eviction). We set it with the precise
+    current time, because the file system may use a coarser clock."""
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+class CsvCache:
+    """A cache of parsed csv files in a directory (see read_csv_cached)."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hashes_file = os.path.join(cache_dir, 'hashes.json')
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def content_hash(self, file_name):
+        """The hash of the file content, which is only calculated if the size or modification time of the file is not
+        the same as the last time."""
+        stat = os.stat(file_name)
+        path = os.path.abspath(file_name)
+        try:
+            with open(self.hashes_file, 'rt', encoding='utf8') as fp:
+                hashes = json.load(fp)
+        except (FileNotFoundError, ValueError):
+            hashes = {}
+        known = hashes.get(path)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['hash']
+        hashes[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': file_hash(file_name)}
+        self._write_atomic(self.hashes_file, json.dumps(hashes).encode('utf8'))
+        return hashes[path]['hash']
+
+    def entry_path(self, file_name, read_options):
+        options = json.dumps(normalize_option(read_options), sort_keys=True)
+        key = hashlib.blake2b((self.content_hash(file_name) + options).encode('utf8'), digest_size=20).hexdigest()
+        return os.path.join(self.cache_dir, key + '.arrow')
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Loading a cached dataframe by memory mapping the file; returns None if it is not in the cache."""
+        try:
+            table = feather.read_table(path, memory_map=True)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        touch(path)
+        return table.to_pandas()
+
+    def store(self, path, table):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        # not compressed, so that it can be memory mapped without decompressing it
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+        touch(path)
+        self.evict()
+
+    def evict(self):
+        """Deleting the least recently used entries while the cache is bigger than max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.arrow'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def read_csv(self, file_name, **read_options):
+        """The same as pd.read_csv(file_name, **read_options), but the result comes from the cache if possible.
+        A dataframe that would not come back the same from the cache (see arrow_table) is not cached."""
+        if not is_cacheable(read_options):
+            return pd.read_csv(file_name, **read_options)
+        path = self.entry_path(file_name, read_options)
+        df = self.load(path)
+        if df is None:
+            df = pd.read_csv(file_name, **read_options)
+            table = arrow_table(df)
+            if table is not None:
+                self.store(path, table)
+        return df
+
+
+def read_csv_cached(file_name, cache_dir=DEFAULT_CACHE_DIR, max_bytes=1024 ** 3, **read_options):
+    """We read a csv file into a dataframe, like pd.read_csv(file_name, **read_options), but the parsed dataframe is
+    cached in cache_dir (at most max_bytes), and the next time it is loaded from there."""
+    return CsvCache(cache_dir, max_bytes).read_csv(file_name, **read_options)
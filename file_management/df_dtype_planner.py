@@ -0,0 +1,221 @@
+import io
+import os
+import random
+import warnings
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# https://pandas.pydata.org/pandas-docs/stable/user_guide/scale.html#use-efficient-datatypes
+# https://pandas.pydata.org/pandas-docs/stable/user_guide/categorical.html
+
+# By default read_csv loads every integer column as int64, every decimal column as float64 and every text column as
+# object (a Python string per value), which is a waste of memory. plan_dtypes() reads a sample of the file (the first
+# lines and some lines from random places) and chooses the narrowest data type for every column that can hold the
+# sampled values:
+#  - integers: int8, int16, int32 or int64 (Int8, ... if there are missing values)
+#  - decimals: float32 if the values have the same text form in float32, otherwise float64
+#  - texts: datetime if all the values are dates, category if there are only a few different values, otherwise object
+# read_csv_planned() reads the file in chunks and converts every chunk to the planned types. The sample may not contain
+# the biggest values, so if a value does not fit into the planned type, that chunk (and the next ones) get a wider type.
+
+INT_TYPES = ['int8', 'int16', 'int32', 'int64']
+COMPRESSED_EXTENSIONS = ('.zip', '.gz', '.bz2', '.xz', '.zst')
+
+
+def sample_csv(file_name, head_rows=1000, samples=20, sample_rows=50, seed=0, **read_options):
+    """This function reads a sample of the file as texts (a dataframe with str values): the first head_rows lines and
+    sample_rows lines from samples random places of the file. Compressed files are sampled only from the beginning.
+    The dtype and parse_dates options are not used here, every value is read as a text."""
+    read_options = {key: value for key, value in read_options.items() if key not in ('dtype', 'parse_dates')}
+    head = pd.read_csv(file_name, nrows=head_rows, dtype=str, **read_options)
+    if str(file_name).endswith(COMPRESSED_EXTENSIONS) or read_options.get('compression'):
+        return head
+    encoding = read_options.get('encoding') or 'utf8'
+    size = os.path.getsize(file_name)
+    parts = [head]
+    rand = random.Random(seed)
+    with open(file_name, 'rb') as fp:
+        header = fp.readline()
+        for _ in range(samples):
+            fp.seek(rand.randrange(len(header), max(size, len(header) + 1)))
+            fp.readline()  # skipping the rest of the line where we landed
+            lines = b''.join(fp.readline() for _ in range(sample_rows))
+            if not lines:
+                continue
+            try:
+                part = pd.read_csv(io.StringIO((header + lines).decode(encoding)), dtype=str, **read_options)
+            except (ValueError, UnicodeDecodeError):  # we may have landed inside a quoted field
+                continue
+            if list(part.columns) == list(head.columns):
+                parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def float32_is_safe(values):
+    """The float32 values have the same (shortest) text form as the original float64 values."""
+    values = np.asarray(values, dtype=np.float64)
+    return bool((values.astype(np.float32).astype(str).astype(np.float64) == values).all())
+
+
+def int_type(minimum, maximum, start='int8'):
+    """The narrowest integer type (from start) that can hold the values between minimum and maximum."""
+    for name in INT_TYPES[INT_TYPES.index(start):]:
+        info = np.iinfo(name)
+        if info.min <= minimum and maximum <= info.max:
+            return name
+    return None
+
+
+def parse_dates(values):
+    """This function parses the values to dates; returns None if not all of them are dates."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # pandas warns if it cannot guess the date format
+        dates = pd.to_datetime(values, errors='coerce')
+    return None if dates.isna().any() else dates
+
+
+def plan_column(texts, max_category_ratio=0.5):
+    """This function chooses the data type of a column from its sampled values (texts)."""
+    values = texts.dropna()
+    if values.empty:
+        return 'object'
+    has_missing = len(values) < len(texts)
+    numbers = pd.to_numeric(values, errors='coerce')
+    if numbers.notna().all():
+        if (numbers == numbers.round()).all() and not values.str.contains(r'[.eE]').any():
+            name = int_type(numbers.min(), numbers.max()) or 'float64'
+            return name.capitalize() if has_missing and name != 'float64' else name
+        return 'float32' if float32_is_safe(numbers) else 'float64'
+    if values.isin(['True', 'False']).all() and not has_missing:
+        return 'bool'
+    if values.str.match(r'^\d').all() and parse_dates(values) is not None:
+        return 'datetime'
+    if values.nunique() <= len(values) * max_category_ratio:
+        return 'category'
+    return 'object'
+
+
+def typed_by_caller(column, read_options):
+    """True if the type of the column is given by the caller in the dtype or parse_dates options of read_csv."""
+    dtype, dates = read_options.get('dtype'), read_options.get('parse_dates')
+    return ((dtype is not None and (not isinstance(dtype, dict) or column in dtype))
+            or (isinstance(dates, (list, tuple)) and column in dates))
+
+
+def plan_dtypes(file_name, **read_options):
+    """We sample the file and return the planned data type of every column (a dictionary), except the columns whose
+    type is given in the dtype or parse_dates options."""
+    sample = sample_csv(file_name, **read_options)
+    return {column: plan_column(sample[column]) for column in sample.columns
+            if not typed_by_caller(column, read_options)}
+
+
+def cast_column(values, dtype):
+    """This function converts a column of a chunk (read by read_csv with its default types) to the planned type.
+    If the values do not fit into it, a wider type is used. It returns the converted values and their type."""
+    if dtype.lower() in INT_TYPES:
+        numbers = pd.to_numeric(values, errors='coerce')
+        present = numbers.dropna()
+        if numbers.isna().sum() == values.isna().sum() and (present == present.round()).all():
+            name = int_type(present.min(), present.max(), dtype.lower()) if len(present) else dtype.lower()
+            if name is not None:
+                name = name.capitalize() if dtype[0] == 'I' or values.isna().any() else name
+                return numbers.astype(name), name
+        dtype = 'float64'  # not integers anymore, or too big
+    if dtype == 'float32':
+        numbers = pd.to_numeric(values, errors='coerce')
+        if numbers.isna().sum() == values.isna().sum() and float32_is_safe(numbers):
+            return numbers.astype('float32'), dtype
+        dtype = 'float64'
+    if dtype == 'float64':
+        numbers = pd.to_numeric(values, errors='coerce')
+        if numbers.isna().sum() == values.isna().sum():
+            return numbers.astype('float64'), dtype
+        return values.astype(object), 'object'
+    if dtype == 'datetime':
+        dates = parse_dates(values.dropna())
+        if dates is not None:
+            return pd.to_datetime(values), dtype
+        return values.astype(object), 'object'
+    if dtype in ('bool', 'boolean'):
+        try:  # missing values would be True in a numpy bool column
+            dtype = 'boolean' if values.isna().any() else 'bool'
+            return values.astype(dtype), dtype
+        except (TypeError, ValueError):
+            return values.astype(object), 'object'
+    if dtype == 'category':
+        return values.astype(dtype), dtype
+    return values, dtype
+
+
+def parse_options(plan, read_options):
+    """The dtype and parse_dates options of read_csv for the plan, so that read_csv creates the planned types while
+    parsing (the integers as nullable types, a later chunk may have missing values). The dtype and parse_dates options
+    of the caller are kept (the plan does not have those columns, see read_csv_planned)."""
+    dtypes = {column: dtype.capitalize() if dtype.lower() in INT_TYPES else
+              {'float32': 'float64', 'bool': 'boolean'}.get(dtype, dtype)
+              for column, dtype in plan.items() if dtype not in ('object', 'datetime')}
+    dates = [column for column, dtype in plan.items() if dtype == 'datetime']
+    options = {'dtype': dict(dtypes, **read_options.get('dtype', {})) if 'dtype' not in read_options or
+               isinstance(read_options['dtype'], dict) else read_options['dtype']}
+    if 'parse_dates' not in read_options:
+        options['parse_dates'] = dates
+    elif isinstance(read_options['parse_dates'], (list, tuple)):
+        options['parse_dates'] = list(read_options['parse_dates']) + dates
+    return options
+
+
+def read_chunks(file_name, plan, chunksize, read_options, typed=True):
+    """We read the file in chunks, converted to the planned types (the plan is updated if a chunk needs a wider
+    type). If typed is False, read_csv does not get the planned types, the chunks are only converted after parsing."""
+    options = dict(read_options, **parse_options(plan, read_options)) if typed else read_options
+    chunks = []
+    for chunk in pd.read_csv(file_name, chunksize=chunksize, **options):
+        for column in chunk.columns:
+            if column in plan:
+                chunk[column], plan[column] = cast_column(chunk[column], plan[column])
+        chunks.append(chunk)
+    return chunks
+
+
+def read_csv_planned(file_name, plan=None, chunksize=100000, **read_options):
+    """We read a csv file into a dataframe with the planned data types (plan_dtypes() if plan is not given), chunk by
+    chunk, so the file is never loaded with the default (wide) data types as a whole. read_csv gets the planned types,
+    so it does not have to guess them; if a value does not fit (for example a bigger integer than in the sample), the
+    file is read again with the default types, and the chunks are converted after parsing.
+    The columns in the dtype and parse_dates options keep the types given there."""
+    plan = {column: dtype for column, dtype in (plan or plan_dtypes(file_name, **read_options)).items()
+            if not typed_by_caller(column, read_options)}
+    try:
+        chunks = read_chunks(file_name, dict(plan), chunksize, read_options)
+    except (TypeError, ValueError, OverflowError):
+        chunks = read_chunks(file_name, plan, chunksize, read_options, typed=False)
+    if not chunks:
+        return pd.read_csv(file_name, **read_options)
+    # the chunks must have the same categories, otherwise concat would convert the column back to object
+    for column in chunks[0].columns:
+        if all(isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks):
+            categories = union_categoricals([chunk[column] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks)
+
+
+def memory_report(file_name, plan=None, chunksize=100000, **read_options):
+    """This function loads the file with the default read_csv and with read_csv_planned, and returns the data types
+    and the memory usage (bytes) of every column in both cases, plus a 'total' row."""
+    default = pd.read_csv(file_name, **read_options)
+    planned = read_csv_planned(file_name, plan, chunksize, **read_options)
+    report = pd.DataFrame({'default_dtype': default.dtypes.astype(str), 'planned_dtype': planned.dtypes.astype(str),
+                           'default_bytes': default.memory_usage(index=False, deep=True),
+                           'planned_bytes': planned.memory_usage(index=False, deep=True)})
+    report.loc['total'] = ['', '', report['default_bytes'].sum(), report['planned_bytes'].sum()]
+    report['saved_percent'] = (100 - report['planned_bytes'] / report['default_bytes'] * 100).round(1)
+    return report
+
+
+if __name__ == "__main__":
+    print(memory_report('../data/taxi.csv'))
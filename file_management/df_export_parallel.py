@@ -0,0 +1,132 @@
+import gzip
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+# https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.DataFrame.to_csv.html
+# https://docs.python.org/3/library/zlib.html
+# https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT (the zip file format)
+# https://zlib.net/pigz/ (the idea of compressing the blocks of one deflate stream in parallel)
+
+# df.to_csv(..., compression=...) converts and compresses the data in one thread. to_csv_compressed() converts the
+# dataframe into csv text block by block (block_rows rows), and compresses the blocks in a thread pool (zlib releases
+# the GIL while it compresses, so the threads really run in parallel):
+#  - gzip: every block is a complete gzip member; a gzip file can contain several members one after the other, and
+#    they are decompressed as one file
+#  - zip: every block is compressed into a part of one deflate stream (the blocks end with a sync flush, only the last
+#    block finishes the stream) and we write the zip file headers ourselves. Every block uses the end of the previous
+#    block as its dictionary, so the compression ratio stays almost the same.
+
+DICTIONARY_SIZE = 32 * 1024  # the window size of deflate
+
+
+def gzip_block(data, previous, last, compresslevel):
+    return gzip.compress(data, compresslevel=compresslevel, mtime=0)
+
+
+def deflate_block(data, previous, last, compresslevel):
+    """This function compresses a block into a part of a raw deflate stream."""
+    if previous:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15, zdict=previous[-DICTIONARY_SIZE:])
+    else:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def csv_blocks(df, block_rows, header, encoding, to_csv_options):
+    """This function converts the dataframe into csv text block by block and returns the blocks (bytes) one-by-one."""
+    for start in range(0, max(len(df), 1), block_rows):
+        text = df.iloc[start:start + block_rows].to_csv(header=header if start == 0 else False, **to_csv_options)
+        yield text.encode(encoding)
+
+
+def compress_blocks(blocks, compress, compresslevel, workers):
+    """This function compresses the blocks in a thread pool and returns (block, compressed block) pairs in the
+    original order. Only 2 * workers blocks are in progress at once, so the memory usage is bounded."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_progress = deque()
+        previous = b''
+        blocks = iter(blocks)
+        block = next(blocks, None)
+        while block is not None:
+            next_block = next(blocks, None)
+            in_progress.append((block, executor.submit(compress, block, previous, next_block is None, compresslevel)))
+            previous, block = block, next_block
+            if len(in_progress) >= 2 * workers:
+                data, future = in_progress.popleft()
+                yield data, future.result()
+        while in_progress:
+            data, future = in_progress.popleft()
+            yield data, future.result()
+
+
+def dos_date_time(timestamp):
+    """The date and time format of the zip file headers."""
+    t = time.localtime(timestamp)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return dos_date, dos_time
+
+
+def write_zip(fp, archive_name, compressed_blocks):
+    """We write a zip file with one member (archive_name) into fp (a seekable file opened in binary mode), from
+    (block, compressed block) pairs of one deflate stream. We use the zip64 extension, so the size is not limited."""
+    name = archive_name.encode('utf8')
+    dos_date, dos_time = dos_date_time(time.time())
+    header_offset = fp.tell()
+    # local file header: the crc and the sizes are filled in at the end (the sizes are in the zip64 extra field)
+    fp.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 45, 0x0800, zlib.DEFLATED, dos_time, dos_date, 0,
+                         0xFFFFFFFF, 0xFFFFFFFF, len(name), 20))
+    fp.write(name)
+    extra_offset = fp.tell()
+    fp.write(struct.pack('<HHQQ', 0x0001, 16, 0, 0))
+    crc, size, compressed_size = 0, 0, 0
+    for block, compressed in compressed_blocks:
+        crc = zlib.crc32(block, crc)
+        size += len(block)
+        compressed_size += len(compressed)
+        fp.write(compressed)
+    directory_offset = fp.tell()
+    fp.seek(header_offset + 14)
+    fp.write(struct.pack('<I', crc))
+    fp.seek(extra_offset)
+    fp.write(struct.pack('<HHQQ', 0x0001, 16, size, compressed_size))
+    fp.seek(directory_offset)
+    # central directory
+    fp.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 45, 45, 0x0800, zlib.DEFLATED, dos_time, dos_date, crc,
+                         0xFFFFFFFF, 0xFFFFFFFF, len(name), 28, 0, 0, 0, 0o100644 << 16, 0xFFFFFFFF))
+    fp.write(name)
+    fp.write(struct.pack('<HHQQQ', 0x0001, 24, size, compressed_size, header_offset))
+    directory_size = fp.tell() - directory_offset
+    # zip64 end of central directory record and its locator, then the end of central directory record
+    zip64_end_offset = fp.tell()
+    fp.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, 1, 1, directory_size, directory_offset))
+    fp.write(struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1))
+    fp.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, 1, 1, directory_size,
+                         min(directory_offset, 0xFFFFFFFF), 0))
+
+
+def to_csv_compressed(df, path, method='zip', archive_name=None, header=True, encoding='utf8', compresslevel=6,
+                      block_rows=100000, workers=None, **to_csv_options):
+    """We export the dataframe into a gzip or zip compressed csv file (method), like
+    df.to_csv(path, compression={'method': method, 'archive_name': archive_name}, header=header, **to_csv_options),
+    but the blocks of block_rows rows are compressed in parallel by workers threads (default: number of CPUs).
+    The to_csv_options (date_format, index, sep, ...) are passed to to_csv, so they work the same way.
+    """
+    workers = workers or os.cpu_count()
+    blocks = csv_blocks(df, block_rows, header, encoding, to_csv_options)
+    with open(path, 'wb') as fp:
+        if method == 'gzip':
+            for _, compressed in compress_blocks(blocks, gzip_block, compresslevel, workers):
+                fp.write(compressed)
+        elif method == 'zip':
+            if archive_name is None:  # the same as in pandas: the file name without .zip
+                archive_name = os.path.basename(str(path))
+                archive_name = archive_name[:-4] if archive_name.endswith('.zip') else archive_name
+            write_zip(fp, archive_name, compress_blocks(blocks, deflate_block, compresslevel, workers))
+        else:
+            raise ValueError('Unknown compression method: {0}'.format(method))
@@ -27,6 +27,9 @@ df2 = pd.read_csv('../data/taxi.csv', skip_blank_lines=True,  delimiter=',', dec
                   # date_parser=our own parser function, otherwise automatic
                   )
 
+# file_management/df_dtype_planner.py can choose the narrowest dtypes automatically from a sample of the file:
+# read_csv_planned('../data/taxi.csv'), and memory_report() shows how much memory it saves
+
 print(df1.dtypes)
 print(df2.dtypes)  # here dates are datetime objects
 
@@ -69,6 +72,8 @@ for chunk in df_reader:
     print(len(chunk))  # the number of rows in each chunk (we have 10 000 rows, so we have 10 times 1000 rows)
 
 # It is memory-efficient, but it is not as "easy" as with a single dataframe to perform operations such as groupby().
+# file_management/df_streaming_groupby.py calculates groupby() statistics chunk by chunk and merges them at the end:
+# streaming_groupby(df_reader, by='VendorID', columns=['trip_distance', 'tip_amount'], distinct=['PULocationID'])
 
 
 # ********** There are simple ways to read Excel, JSON and other files also:
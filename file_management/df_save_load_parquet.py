@@ -81,18 +81,27 @@ print(opfcp.head())
 print(opfcp.dtypes)
 
 # changing the data type in pandas (it may be late already)
+# file_management/parquet_read.py has read_pandas_typed(), which converts the columns to the target types in pyarrow,
+# for example:
+#   read_pandas_typed('../data/opfcp.parquet', {'c_ean': 'int32', 'c_mag': 'category', 'c_promo': 'category'})
 opfcp = opfcp.astype({'price': 'float64', 'c_ean': 'int32', 'c_mag': 'string', 'c_promo': 'string'})
 print(opfcp.dtypes)
 
 
 # to be checked: memory_map=True --> uses a memory map to read file, which can improve performance in some environments
+# file_management/parquet_read.py has read_pandas_low_memory(), which uses memory_map=True, split_blocks=True and
+# self_destruct=True to load a file with less memory than the simple way above
 
 # to be checked: partitioning --> (Partitioning or str or list of str, default "hive")
 # The partitioning scheme for a partitioned dataset. The default of “hive” assumes directory names with key=value pairs
 # like “/year=2009/month=11”. In addition, a scheme like “/2009/11” is also supported, in which case you need to specify
 # the field names or a full schema. See the pyarrow.dataset.partitioning() function for more details.
+# file_management/parquet_write.py has write_partitioned() to write such a dataset (for example by c_mag, sorted by
+# c_ean), and file_management/parquet_read.py has read_dataset() to read it with partition pruning.
 
 # to be checked: filters --> the actual code implementation and documentation do not match for pyarrow's read_table.
+# file_management/parquet_read.py has read_where(), which skips the row groups by their min/max statistics:
+# read_where('../data/opfcp.parquet', ['c_ean', 'price'], [('c_mag', '=', 12), ('price', 'between', (10, 20))])
 
 
 # ********** Saving data into a parquet file
@@ -124,6 +133,9 @@ opfcp_parquet = pa.Table.from_pandas(opfcp,
 
 pq.write_table(opfcp_parquet, '../data/opfcp_ean_only.parquet')
 # for more write_table parameters: https://arrow.apache.org/docs/python/generated/pyarrow.parquet.write_table.html
+# file_management/parquet_write.py has tune_writer() to choose the row group size, compression, dictionary encoding and
+# statistics settings by measuring them on a sample (benchmarks/bench_parquet_tuner.py has the results for opfcp and
+# taxi).
 
 # check whether we really have only c_ean
 opfcp = pq.read_pandas('../data/opfcp_ean_only.parquet').to_pandas()
@@ -0,0 +1,142 @@
+import multiprocessing
+from functools import partial, reduce
+
+import numpy as np
+import pandas as pd
+
+
+# https://maxhalford.github.io/blog/pandas-streaming-groupby/
+# https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Parallel_algorithm
+# https://en.wikipedia.org/wiki/HyperLogLog
+
+# Group by on a file that is read in chunks (pd.read_csv(..., chunksize=1000)).
+# For every chunk we calculate a partial state per group, which is small, and the states can be merged:
+#  - count, sum, min and max: simply added up or compared
+#  - mean and variance: the mean and the sum of squared differences from the mean (m2) are merged by the parallel
+#    algorithm of Chan et al., so we do not lose precision by summing up squares
+#  - approximate number of distinct values: a HyperLogLog sketch, 2 ** precision registers per group, merged by max()
+# At the end, finalize_state() calculates the same result as df.groupby(by)[columns].agg(STATS) on the whole data.
+
+STATS = ['count', 'sum', 'min', 'max', 'mean', 'var']
+
+
+def count_leading_zeros(values):
+    """This function counts the leading zero bits of 64 bit unsigned integers (numpy array), by binary search."""
+    zeros = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        no_bits = (values >> np.uint64(64 - shift)) == 0  # the top shift bits are all zero
+        zeros[no_bits] += shift
+        values = np.where(no_bits, values << np.uint64(shift), values)
+    return zeros
+
+
+def distinct_sketch(chunk, by, column, precision):
+    """This function returns the HyperLogLog registers of a column per group: a dataframe whose index is the group
+    key and it has a column for every register (the maximum rank of the hashed values that fell into it)."""
+    values = chunk[by + [column]].dropna(subset=[column])
+    hashes = pd.util.hash_pandas_object(values[column], index=False).to_numpy()
+    # the first precision bits choose the register, the rank is the position of the first 1 bit in the rest of the bits
+    # (the bit after them is set, so that the rank is at most 64 - precision + 1)
+    rest = (hashes << np.uint64(precision)) | np.uint64(1 << (precision - 1))
+    registers = values[by].assign(register=(hashes >> np.uint64(64 - precision)).astype(np.int64),
+                                  rank=count_leading_zeros(rest) + 1)
+    sketch = registers.groupby(by + ['register'])['rank'].max().unstack('register', fill_value=0)
+    return sketch.reindex(columns=range(2 ** precision), fill_value=0).astype(np.uint8)
+
+
+def estimate_distinct(sketch):
+    """This function estimates the number of distinct values from the HyperLogLog registers (per group)."""
+    m = sketch.shape[1]
+    registers = sketch.to_numpy().astype(np.float64)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.power(2.0, -registers).sum(axis=1)
+    empty = (registers == 0).sum(axis=1)
+    # for small numbers the estimate is not accurate: we use linear counting based on the number of empty registers
+    small = (estimate <= 2.5 * m) & (empty > 0)
+    estimate[small] = m * np.log(m / empty[small])
+    return pd.Series(np.round(estimate).astype(np.int64), index=sketch.index)
+
+
+def chunk_state(chunk, by, columns, distinct=(), precision=10):
+    """This function calculates the partial state of a chunk (a dataframe): a dictionary with the statistics per group
+    ('stats') and the HyperLogLog sketches of the distinct columns ('sketches')."""
+    stats = chunk.groupby(by)[columns].agg(['count', 'sum', 'min', 'max', 'mean', 'var'])
+    for column in columns:
+        # the sum of squared differences from the mean; var is NaN if there is only one value in the group
+        stats[column, 'm2'] = (stats[column, 'var'] * (stats[column, 'count'] - 1)).fillna(0)
+    stats = stats.drop(columns=[(column, 'var') for column in columns])
+    sketches = {column: distinct_sketch(chunk, by, column, precision) for column in distinct}
+    return {'stats': stats, 'sketches': sketches}
+
+
+def merge_stats(a, b, columns):
+    """This function merges the statistics of two partial states."""
+    keys = a.index.union(b.index)
+    dtypes_a, dtypes_b = a.dtypes, b.dtypes
+    a, b = a.reindex(keys), b.reindex(keys)  # the missing groups are NaN, so integer columns become float
+    merged = {}
+    for column in columns:
+        count_a, count_b = a[column, 'count'].fillna(0), b[column, 'count'].fillna(0)
+        count = count_a + count_b
+        mean_a, mean_b = a[column, 'mean'].fillna(0), b[column, 'mean'].fillna(0)
+        delta = mean_b - mean_a
+        merged[column, 'count'] = count
+        merged[column, 'sum'] = a[column, 'sum'].fillna(0) + b[column, 'sum'].fillna(0)
+        merged[column, 'min'] = np.fmin(a[column, 'min'], b[column, 'min'])  # fmin and fmax ignore NaN
+        merged[column, 'max'] = np.fmax(a[column, 'max'], b[column, 'max'])
+        merged[column, 'mean'] = (mean_a + delta * count_b / count).where(count > 0)
+        merged[column, 'm2'] = (a[column, 'm2'].fillna(0) + b[column, 'm2'].fillna(0)
+                                + delta ** 2 * count_a * count_b / count.where(count > 0)).fillna(0)
+    for column in columns:
+        # every group has a sum, min and max in a or b, so an integer statistic of both can be cast back (a chunk of
+        # read_csv can have float values in a column that is integer in the other chunks, then it stays float)
+        for stat in ['sum', 'min', 'max']:
+            dtype = np.result_type(dtypes_a[column, stat], dtypes_b[column, stat])
+            if merged[column, stat].notna().all():
+                merged[column, stat] = merged[column, stat].astype(dtype)
+    return pd.DataFrame(merged, index=keys)
+
+
+def merge_states(a, b):
+    """This function merges two partial states (returned by chunk_state or merge_states)."""
+    columns = list(dict.fromkeys(a['stats'].columns.get_level_values(0)))
+    sketches = {}
+    for column, sketch in a['sketches'].items():
+        both = pd.concat([sketch, b['sketches'][column]])
+        sketches[column] = both.groupby(level=list(range(both.index.nlevels))).max()
+    return {'stats': merge_stats(a['stats'], b['stats'], columns), 'sketches': sketches}
+
+
+def finalize_state(state):
+    """This function calculates the final result from a (merged) state: the columns are (column, statistic) pairs,
+    as in the result of groupby().agg(STATS), plus (column, 'nunique') for the distinct columns (approximate)."""
+    stats = state['stats']
+    result = {}
+    for column in dict.fromkeys(stats.columns.get_level_values(0)):
+        count = stats[column, 'count']
+        result[column, 'count'] = count.astype(np.int64)
+        for stat in ['sum', 'min', 'max', 'mean']:
+            result[column, stat] = stats[column, stat]
+        result[column, 'var'] = stats[column, 'm2'] / (count - 1).where(count > 1)
+    for column, sketch in state['sketches'].items():
+        result[column, 'nunique'] = estimate_distinct(sketch).reindex(stats.index, fill_value=0)
+    return pd.DataFrame(result, index=stats.index).sort_index()
+
+
+def streaming_groupby(chunks, by, columns, distinct=(), precision=10, processes=1):
+    """We calculate the group by statistics (STATS, and the approximate number of distinct values of the distinct
+    columns) on an iterable of dataframes, for example on the TextFileReader returned by pd.read_csv(chunksize=...).
+    If processes is not 1, the partial states of the chunks are calculated in a process pool.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    calculate_state = partial(chunk_state, by=by, columns=columns, distinct=distinct, precision=precision)
+    if processes == 1:
+        states = map(calculate_state, chunks)
+        return finalize_state(reduce(merge_states, states))
+    with multiprocessing.Pool(processes=processes) as pool:
+        return finalize_state(reduce(merge_states, pool.imap(calculate_state, chunks)))
+
+
+if __name__ == "__main__":
+    df_reader = pd.read_csv('../data/taxi.csv', header=0, chunksize=1000)
+    print(streaming_groupby(df_reader, 'passenger_count', ['trip_distance', 'tip_amount'],
+                            distinct=['PULocationID']))
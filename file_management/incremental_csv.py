@@ -0,0 +1,103 @@
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+
+from file_management.read_write_files import columns, compile_columns, find_line_end, split_csv_ranges
+
+
+# Reading only the new lines of an append-only csv file.
+# After reading the file we save a checkpoint next to it (a small json file): the position where we stopped, the hash
+# of the last line that we read and a fingerprint of the header and the columns list. The next time we jump to the saved
+# position and read only the lines that were appended since then. If the file was truncated or rewritten (the last line
+# that we read is not at the same place anymore) or the schema changed, we read the whole file again.
+
+
+def schema_fingerprint(header, column_list=columns):
+    """This function returns a hash of the header of the file and the columns list."""
+    schema = [header, [[col.src, col.dest, col.convert.__name__] for col in column_list]]
+    return hashlib.sha256(json.dumps(schema).encode('utf8')).hexdigest()
+
+
+def line_hash(line):
+    return hashlib.sha256(line).hexdigest()
+
+
+def load_checkpoint(checkpoint_file):
+    """This function loads the checkpoint (a dictionary) or returns None if there is no checkpoint yet."""
+    try:
+        with open(checkpoint_file, 'rt', encoding='utf8') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(checkpoint_file, checkpoint):
+    """We write the checkpoint into a temporary file first and rename it, so the checkpoint is never half-written."""
+    with open(checkpoint_file + '.tmp', 'wt', encoding='utf8') as fp:
+        json.dump(checkpoint, fp)
+    os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+
+def checkpoint_is_valid(checkpoint, data, header_end, fingerprint):
+    """The checkpoint can be used if the schema is the same and the last line that we read is still at the same place
+    in the file (the file was only appended since then)."""
+    if checkpoint is None or checkpoint['schema'] != fingerprint:
+        return False
+    start, offset = checkpoint['last_line_start'], checkpoint['offset']
+    if offset < header_end or offset > len(data):
+        return False
+    return line_hash(data[start:offset]) == checkpoint['last_line_hash']
+
+
+def complete_lines(data, start, end):
+    """This function returns the start position of the last complete csv line between start and end, and the end of
+    the complete lines (an unfinished line at the end of the file, which is being written, is left for the next run)."""
+    last_line_start = complete_end = start
+    while start < end:
+        line_end = find_line_end(data, start)
+        if data[line_end - 1:line_end] != b'\n':  # the last line of the file is not finished yet
+            break
+        last_line_start, complete_end, start = start, line_end, line_end
+    return last_line_start, complete_end
+
+
+def iter_new_records(file_name, checkpoint_file=None, chunk_bytes=4 * 1024 * 1024):
+    """We read the lines that were appended to the file since the last run and return the records one-by-one (yield),
+    as iter_compiled_records does. The checkpoint is saved (by default into file_name + '.checkpoint') when all the
+    records have been consumed, so if the processing stops in the middle, the next run returns the same records again.
+    """
+    file_name = str(file_name)
+    checkpoint_file = checkpoint_file or file_name + '.checkpoint'
+    if os.path.getsize(file_name) == 0:
+        return
+    with open(file_name, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header_end = find_line_end(data, 0)
+        if data[header_end - 1:header_end] != b'\n':
+            return
+        header = next(csv.reader(io.StringIO(data[:header_end].decode('utf8'), newline='')))
+        fingerprint = schema_fingerprint(header)
+        checkpoint = load_checkpoint(checkpoint_file)
+        if checkpoint_is_valid(checkpoint, data, header_end, fingerprint):
+            last_line_start, start = checkpoint['last_line_start'], checkpoint['offset']
+        else:
+            last_line_start, start = 0, header_end  # full scan
+
+        convert_row = compile_columns(header)
+        last_range = None
+        for range_start, range_end in split_csv_ranges(data, start, chunk_bytes):
+            if range_end == len(data):
+                range_end = complete_lines(data, range_start, range_end)[1]
+                if range_end == range_start:
+                    break
+            text = data[range_start:range_end].decode('utf8')
+            yield from map(convert_row, filter(None, csv.reader(io.StringIO(text, newline=''))))
+            last_range = range_start, range_end
+        if last_range is not None:
+            last_line_start, start = complete_lines(data, *last_range)
+
+        save_checkpoint(checkpoint_file, {'offset': start, 'last_line_start': last_line_start,
+                                          'last_line_hash': line_hash(data[last_line_start:start]),
+                                          'schema': fingerprint})
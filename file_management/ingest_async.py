@@ -0,0 +1,94 @@
+import asyncio
+import csv
+import io
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from file_management.read_write_files import columns, convert_csv_lines, find_line_end
+
+
+# https://docs.python.org/3/library/asyncio.html
+# https://docs.python.org/3/library/asyncio-eventloop.html#asyncio.loop.run_in_executor
+
+# Converting a lot of small csv files one after the other (as read_with_validate_and_write does) wastes most of the
+# time waiting for the disk. Here several files are processed at the same time: the reading and writing of the files
+# run in threads (the default executor of the event loop), the conversion runs in a process pool, and the event loop
+# makes them overlap. Only "concurrency" files are processed at once, so only that many files are in the memory.
+
+
+# the result of a file: error is None if the file was converted successfully
+IngestResult = namedtuple('IngestResult', 'src dest rows error')
+
+
+def read_bytes(file_name):
+    with open(file_name, 'rb') as fp:
+        return fp.read()
+
+
+def write_bytes(file_name, data):
+    with open(file_name, 'wb') as fp:
+        fp.write(data)
+
+
+def convert_content(data):
+    """This function converts the content of a csv file (bytes) with the columns list, the same way as
+    read_with_validate_and_write does, and returns the new content (bytes) and the number of rows.
+    It raises ValueError for an empty file."""
+    header_end = find_line_end(data, 0)
+    # next() with a default: a StopIteration raised in the process pool would never reach the awaiting coroutine
+    header = next(csv.reader(io.StringIO(data[:header_end].decode('utf8'), newline='')), None)
+    if header is None:
+        raise ValueError('The file is empty, there is no header')
+    output = io.StringIO()
+    csv.writer(output).writerow([col.dest for col in columns])
+    body = convert_csv_lines(header, data[header_end:].decode('utf8'))
+    output.write(body)
+    return output.getvalue().encode('utf8'), body.count('\n')
+
+
+async def ingest_file(src, dest, executor):
+    """This coroutine reads, converts and writes one file. Errors are not raised, but returned in the result."""
+    loop = asyncio.get_running_loop()
+    try:
+        data = await loop.run_in_executor(None, read_bytes, src)
+        new_data, rows = await loop.run_in_executor(executor, convert_content, data)
+        await loop.run_in_executor(None, write_bytes, dest, new_data)
+        return IngestResult(src, dest, rows, None)
+    except Exception as error:
+        return IngestResult(src, dest, 0, error)
+
+
+async def ingest_directory_async(src_dir, dst_dir, concurrency=8, executor=None):
+    """This coroutine converts all the csv files of src_dir into dst_dir (with the same file names).
+    concurrency workers take the files from a queue, so at most concurrency files are in progress at once.
+    The conversion runs in the given executor (a new process pool by default).
+    It returns the IngestResult of every file, in the order of the file names.
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+    file_names = sorted(name for name in os.listdir(src_dir) if name.endswith('.csv'))
+    files = asyncio.Queue()
+    for name in file_names:
+        files.put_nowait(name)
+    results = {}
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor()
+
+    async def worker():
+        while not files.empty():
+            name = files.get_nowait()
+            results[name] = await ingest_file(os.path.join(src_dir, name), os.path.join(dst_dir, name), executor)
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return [results[name] for name in file_names]
+
+
+def ingest_directory(src_dir, dst_dir, concurrency=8, executor=None):
+    """We convert all the csv files of a directory into another one, processing concurrency files at once.
+    See ingest_directory_async."""
+    return asyncio.run(ingest_directory_async(src_dir, dst_dir, concurrency, executor))
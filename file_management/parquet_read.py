@@ -0,0 +1,328 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from file_management.read_write_files import make_record_type
+
+
+# https://arrow.apache.org/docs/python/generated/pyarrow.parquet.ParquetFile.html
+# https://arrow.apache.org/docs/python/generated/pyarrow.parquet.FileMetaData.html
+# https://arrow.apache.org/docs/python/compute.html
+
+
+# ********** Reading only the row groups that can match a predicate
+
+# A parquet file stores the minimum, the maximum and the number of missing values of every column in every row group
+# (in the metadata at the end of the file). read_where() checks these statistics first, and reads only the row groups
+# that can contain matching rows; the rows of these row groups are then filtered exactly.
+# The predicate is a list of conditions, which must all be true (AND), for example:
+#   [('c_mag', '=', 12), ('price', 'between', (10, 20)), ('c_promo', 'in', ['A', 'B'])]
+# Operators: =, !=, <, <=, >, >=, between (both ends included), in, is_null, not_null
+
+
+def condition_can_match(operator, value, statistics, num_rows):
+    """This function decides from the statistics of a column chunk whether the condition can be true for any row of
+    the row group. If there are no statistics, we have to read the row group."""
+    if statistics is None:
+        return True
+    null_count = statistics.null_count if statistics.has_null_count else None
+    if operator == 'is_null':
+        return null_count is None or null_count > 0
+    if null_count is not None and null_count == num_rows:  # only missing values: no comparison can be true
+        return False
+    if operator == 'not_null' or not statistics.has_min_max:
+        return True
+    minimum, maximum = statistics.min, statistics.max
+    if operator in ('=', '=='):
+        return minimum <= value <= maximum
+    if operator == '!=':
+        return not (minimum == maximum == value)
+    if operator == '<':
+        return minimum < value
+    if operator == '<=':
+        return minimum <= value
+    if operator == '>':
+        return maximum > value
+    if operator == '>=':
+        return maximum >= value
+    if operator == 'between':
+        return maximum >= value[0] and minimum <= value[1]
+    if operator == 'in':
+        return any(minimum <= item <= maximum for item in value)
+    raise ValueError('Unknown operator: {0}'.format(operator))
+
+
+def prune_row_groups(metadata, predicate, columns=None):
+    """This function returns the indexes of the row groups that can match the predicate, and the number of the bytes
+    (compressed, of the given columns) of the row groups that can be skipped."""
+    positions = {metadata.schema.column(i).path: i for i in range(metadata.num_columns)}
+    kept, skipped_bytes = [], 0
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        if all(condition_can_match(operator, value, row_group.column(positions[column]).statistics,
+                                   row_group.num_rows)
+               for column, operator, value in predicate):
+            kept.append(i)
+        else:
+            skipped_bytes += sum(row_group.column(j).total_compressed_size for j in range(row_group.num_columns)
+                                 if columns is None or row_group.column(j).path_in_schema in columns)
+    return kept, skipped_bytes
+
+
+def predicate_mask(table, predicate):
+    """This function returns a boolean array: which rows of the table match the predicate."""
+    mask = None
+    for column, operator, value in predicate:
+        values = table[column]
+        if operator in ('=', '=='):
+            condition = pc.equal(values, value)
+        elif operator == '!=':
+            condition = pc.not_equal(values, value)
+        elif operator == '<':
+            condition = pc.less(values, value)
+        elif operator == '<=':
+            condition = pc.less_equal(values, value)
+        elif operator == '>':
+            condition = pc.greater(values, value)
+        elif operator == '>=':
+            condition = pc.greater_equal(values, value)
+        elif operator == 'between':
+            condition = pc.and_(pc.greater_equal(values, value[0]), pc.less_equal(values, value[1]))
+        elif operator == 'in':
+            condition = pc.is_in(values, value_set=pa.array(list(value), type=values.type))
+        elif operator == 'is_null':
+            condition = pc.is_null(values)
+        elif operator == 'not_null':
+            condition = pc.is_valid(values)
+        else:
+            raise ValueError('Unknown operator: {0}'.format(operator))
+        condition = pc.fill_null(condition, False)  # a comparison with a missing value is not a match
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return mask
+
+
+def read_where(path, columns=None, predicate=()):
+    """We read the rows of a parquet file that match the predicate (only the given columns, or all of them) into a
+    pyarrow Table. It returns the table and a report (dictionary) about how many row groups and bytes were skipped."""
+    pf = pq.ParquetFile(path)
+    predicate = list(predicate)
+    kept, skipped_bytes = prune_row_groups(pf.metadata, predicate, columns)
+    needed = None if columns is None else list(dict.fromkeys(list(columns) + [c for c, _, _ in predicate]))
+    table = pf.read_row_groups(kept, columns=needed) if kept else pf.schema_arrow.empty_table().select(
+        needed or pf.schema_arrow.names)
+    if predicate:
+        table = table.filter(predicate_mask(table, predicate))
+    if columns is not None:
+        table = table.select(list(columns))
+    report = {'row_groups': pf.metadata.num_row_groups, 'skipped_row_groups': pf.metadata.num_row_groups - len(kept),
+              'skipped_bytes': skipped_bytes}
+    return table, report
+
+
+# ********** Reading a partitioned dataset (a directory written by parquet_write.write_partitioned)
+
+def predicate_expression(predicate):
+    """This function converts a predicate (a list of conditions, as for read_where) into a pyarrow filter expression,
+    which pyarrow uses to skip the partition directories and the row groups of the dataset."""
+    expression = None
+    for column, operator, value in predicate:
+        field = pc.field(column)
+        if operator in ('=', '=='):
+            condition = field == value
+        elif operator == '!=':
+            condition = field != value
+        elif operator == '<':
+            condition = field < value
+        elif operator == '<=':
+            condition = field <= value
+        elif operator == '>':
+            condition = field > value
+        elif operator == '>=':
+            condition = field >= value
+        elif operator == 'between':
+            condition = (field >= value[0]) & (field <= value[1])
+        elif operator == 'in':
+            condition = field.isin(list(value))
+        elif operator == 'is_null':
+            condition = field.is_null()
+        elif operator == 'not_null':
+            condition = field.is_valid()
+        else:
+            raise ValueError('Unknown operator: {0}'.format(operator))
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_dataset(root, columns=None, predicate=()):
+    """We read the rows of a hive partitioned dataset (key=value directories) that match the predicate into a pyarrow
+    Table. If the dataset has a _common_metadata file, its schema is used (for the type of the partition column)."""
+    metadata_file = os.path.join(root, '_common_metadata')
+    schema = pq.read_schema(metadata_file) if os.path.exists(metadata_file) else None
+    return pq.read_table(root, columns=columns, schema=schema, partitioning='hive',
+                         filters=predicate_expression(predicate) if predicate else None)
+
+
+# ********** Loading a parquet file into pandas with less memory
+
+# The simple way (pq.read_table(path).to_pandas()) holds two full copies of the data until the table is deleted: the
+# pyarrow Table and the dataframe. Besides, to_pandas() by default consolidates the columns of the same type into
+# 2D blocks, which is another copy. read_pandas_low_memory() avoids these:
+#  - memory_map=True: the file is memory mapped instead of being read into a buffer
+#  - split_blocks=True: every column gets its own block, so nothing has to be copied for the consolidation
+#  - self_destruct=True: the memory of every column of the table is released as soon as it has been converted
+# After to_pandas(self_destruct=True) the table must not be used anymore, that is why we do it in one function.
+
+def read_pandas_low_memory(path, columns=None):
+    """We load a parquet file (only the given columns, or all of them) into a pandas dataframe with as little memory
+    as possible."""
+    table = pq.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+# ********** Loading with the target data types directly
+
+# In df_save_load_parquet.py the data types are changed with astype() after to_pandas(), when every string has
+# already been converted into a Python object, and every integer into int64. read_pandas_typed() converts the
+# columns to their target types while they are still in pyarrow:
+#  - category: string columns are read as dictionary arrays (read_dictionary) as they are stored in the file, other
+#    columns are dictionary encoded in pyarrow; to_pandas() converts dictionary arrays into pandas.Categorical (a
+#    pd.CategoricalDtype with the categories or the order given is applied after that, with astype())
+#  - numpy types (int32, float32, ...): the column is cast in pyarrow (an error is raised if a value does not fit)
+#  - pandas extension types (string, Int32, ...): the column is cast to the matching pyarrow type, and the
+#    types_mapper of to_pandas() maps that pyarrow type to the pandas type, built from the dtypes
+
+def arrow_type(dtype):
+    """The pyarrow type of a pandas or numpy data type."""
+    dtype = pd.api.types.pandas_dtype(dtype)
+    if isinstance(dtype, pd.StringDtype):
+        return pa.string()
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return pa.from_numpy_dtype(np.dtype(dtype.type))
+    return pa.from_numpy_dtype(dtype)
+
+
+def is_category(dtype):
+    """'category' or a pd.CategoricalDtype (maybe with the categories and their order)."""
+    return isinstance(pd.api.types.pandas_dtype(dtype), pd.CategoricalDtype)
+
+
+def typed_to_pandas(table, dtypes):
+    """Converting a pyarrow Table (already cast to the types of dtypes) into a pandas dataframe. The columns of dtypes
+    with a pandas extension type (for example 'Int16' or 'string') are converted one by one: a types_mapper for the
+    whole table would work by Arrow type, and would change the other columns with the same Arrow type too.
+    A pd.CategoricalDtype (not the plain 'category') gets its categories and order with astype()."""
+    extension = {}
+    for name, dtype in dtypes.items():
+        if is_category(dtype) or name not in table.column_names:
+            continue
+        pandas_dtype = pd.api.types.pandas_dtype(dtype)
+        if isinstance(pandas_dtype, pd.api.extensions.ExtensionDtype):
+            extension[name] = pandas_dtype
+    names = table.column_names
+    columns = {name: table[name] for name in extension}
+    df = table.drop_columns(list(extension)).to_pandas(split_blocks=True, self_destruct=True)
+    for name in sorted(extension, key=names.index):
+        mapping = {arrow_type(extension[name]): extension[name]}
+        df.insert(names.index(name), name, columns[name].to_pandas(types_mapper=mapping.get).array)
+    for name, dtype in dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) and name in df.columns:
+            df[name] = df[name].astype(dtype)
+    return df
+
+
+def read_pandas_typed(path, dtypes, columns=None):
+    """We load a parquet file (only the given columns, or all of them) into a pandas dataframe, converting the
+    columns of dtypes (a dictionary: column name -> data type, for example 'category', 'int32' or 'string') in
+    pyarrow, so the dataframe never holds them in a wider type or as Python objects. The columns that are not in
+    dtypes get the default types of to_pandas()."""
+    schema = pq.read_schema(path)
+    missing = [name for name in dtypes if name not in schema.names]
+    if missing:
+        raise KeyError('The columns of dtypes are not in the file: {0}'.format(', '.join(missing)))
+    categories = [name for name, dtype in dtypes.items() if is_category(dtype)]
+    read_dictionary = [name for name in categories if pa.types.is_string(schema.field(name).type)
+                       or pa.types.is_large_string(schema.field(name).type)]
+    table = pq.read_table(path, columns=columns, memory_map=True, read_dictionary=read_dictionary)
+    for name, dtype in dtypes.items():
+        if name not in table.column_names:  # not in columns
+            continue
+        position = table.column_names.index(name)
+        if is_category(dtype):
+            if name not in read_dictionary:
+                table = table.set_column(position, name, pc.dictionary_encode(table[name]))
+            continue
+        table = table.set_column(position, name, table[name].cast(arrow_type(dtype)))
+    return typed_to_pandas(table, dtypes)
+
+
+# ********** Reading a big file row group by row group, in parallel
+
+# pf.read_row_group(i) reads one row group; iter_row_groups() reads the row groups of a file in a thread pool (pyarrow
+# releases the GIL while it decodes), but returns them in the order of the file. Only prefetch row groups are read
+# ahead, so the memory usage is bounded, and we can process files that are bigger than the memory.
+# Every thread has its own ParquetFile object, because a ParquetFile must not be used by several threads at once.
+
+def iter_row_groups(path, columns=None, workers=4, prefetch=None, to_pandas=False):
+    """We read the row groups of a parquet file (only the given columns, or all of them) with workers threads, and
+    return them one-by-one (yield) in the order of the file, as pyarrow Tables or pandas dataframes (to_pandas).
+    At most prefetch row groups (default: workers) are read ahead of the one that is being processed."""
+    prefetch = max(prefetch or workers, 1)
+    local = threading.local()
+    opened = []
+
+    def read_row_group(i):
+        if not hasattr(local, 'pf'):
+            local.pf = pq.ParquetFile(path, memory_map=True)
+            opened.append(local.pf)
+        table = local.pf.read_row_group(i, columns=columns, use_threads=False)
+        return table.to_pandas() if to_pandas else table
+
+    with pq.ParquetFile(path) as pf:
+        num_row_groups = pf.metadata.num_row_groups
+    in_progress = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for i in range(num_row_groups):
+                    in_progress.append(executor.submit(read_row_group, i))
+                    if len(in_progress) > prefetch:
+                        yield in_progress.popleft().result()
+                while in_progress:
+                    yield in_progress.popleft().result()
+            finally:
+                for future in in_progress:  # if the loop of the caller stopped early
+                    future.cancel()
+    finally:
+        for pf in opened:  # after the executor has finished the running reads
+            pf.close()
+
+
+# ********** Iterating over the rows of a parquet file
+
+# file_management/parquet_to_dicts.py converts the whole table with to_pydict(), zips the columns into row tuples and
+# then creates a dictionary for every row: three copies of the file as Python objects, and a dictionary (with its keys)
+# per row. iter_rows() reads the file batch-by-batch (iter_batches), converts only the columns of the current batch
+# into Python lists, and returns records (see make_record_type() in file_management/read_write_files.py): named tuples
+# that can be used like dictionaries (record['c_ean'], record.get('c_ean'), record.keys()), and record._asdict()
+# gives a real dictionary. The memory use depends on the batch size, not on the size of the file.
+
+def iter_rows(path, columns=None, batch_size=65536):
+    """We read the parquet file (only the given columns, or all of them) in batches of batch_size rows, and return the
+    rows one-by-one (yield) as records."""
+    pf = pq.ParquetFile(path, memory_map=True)
+    try:
+        Record = make_record_type(columns or pf.schema_arrow.names)
+        new = tuple.__new__
+        for batch in pf.iter_batches(batch_size=batch_size, columns=columns):
+            values = [column.to_pylist() for column in batch.columns]
+            for row in zip(*values):
+                yield new(Record, row)
+    finally:
+        pf.close()
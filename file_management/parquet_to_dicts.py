@@ -26,3 +26,9 @@ for record in pivoted_values:
 
 # At the end, we will have a list of dictionaries with the normal row data (not the columnar data)
 print(table_dictionary_array[0:5])  # checking the first 5 rows
+
+# The above keeps three copies of the file as Python objects (to_pydict(), the zipped tuples and the dictionaries).
+# file_management/parquet_read.py has iter_rows(), which reads the file batch-by-batch and returns the rows one-by-one
+# as named tuples that also work like dictionaries (row['c_ean'], row.get('c_ean'), row.keys(), row._asdict()):
+# for row in iter_rows('../data/opfcp.parquet'):
+#     print(row['c_ean'])
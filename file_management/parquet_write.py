@@ -0,0 +1,140 @@
+import itertools
+import os
+import shutil
+import tempfile
+import time
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from file_management.parquet_read import read_where
+
+
+# https://arrow.apache.org/docs/python/generated/pyarrow.parquet.ParquetWriter.html
+# https://arrow.apache.org/docs/python/parquet.html#partitioned-datasets-multiple-files
+# https://arrow.apache.org/docs/python/generated/pyarrow.parquet.write_metadata.html
+
+
+# ********** Writing a partitioned and sorted dataset
+
+# Instead of one big file, write_partitioned() writes a directory per value of the partition column, in the "hive"
+# style (key=value directory names), for example:
+#   opfcp/c_mag=12/part-00000.parquet
+#   opfcp/c_mag=13/part-00000.parquet
+# A query for some values of the partition column has to read only their directories. Within a partition the rows are
+# sorted by sort_by, so the min/max statistics of the row groups are narrow, and the readers can skip most row groups
+# for a range of sort_by (see parquet_read.read_where and parquet_read.read_dataset).
+# A file has at most file_rows rows, and a row group has at most row_group_rows rows (or row_group_bytes and
+# file_bytes, estimated from the in-memory size of the rows).
+# The schema of the whole dataset is saved into the _common_metadata file, so the readers know the data type of the
+# partition column (otherwise it would be guessed from the directory names).
+
+HIVE_NULL = '__HIVE_DEFAULT_PARTITION__'  # the directory name of the missing values, as in pyarrow and Hive
+
+
+def partition_ranges(values):
+    """This function returns the (value, start, end) of the runs of equal values of a sorted pyarrow column (missing
+    values at the end, their value is None). The values are Python objects from Arrow (as_py), so an integer column
+    with missing values gives integers, not floats as numpy would."""
+    runs = pc.run_end_encode(values.combine_chunks() if isinstance(values, pa.ChunkedArray) else values)
+    ends = runs.run_ends.to_pylist()
+    return [(value, start, end) for value, start, end in zip(runs.values.to_pylist(), [0] + ends[:-1], ends)]
+
+
+def rows_for_bytes(table, target_bytes):
+    """The number of rows that take about target_bytes, by the average size of a row in the memory (Arrow). The files
+    are smaller than that, because of the encoding and the compression."""
+    row_bytes = table.nbytes / max(table.num_rows, 1)
+    return max(int(target_bytes // max(row_bytes, 1)), 1)
+
+
+def write_partitioned(data, root, partition_by, sort_by=None, row_group_rows=1000000, file_rows=10000000,
+                      overwrite=False, row_group_bytes=None, file_bytes=None, **writer_options):
+    """We write a pandas dataframe or a pyarrow Table into a hive partitioned parquet dataset in the root directory:
+    a directory per value of partition_by, with the rows sorted by sort_by (a column name or a list of them).
+    The size of the row groups and the files can also be limited in bytes (row_group_bytes, file_bytes): these are
+    converted to rows by the average in-memory size of a row, so they are upper limits of the uncompressed data.
+    The writer_options are passed to ParquetWriter (for example compression). It returns the list of written files.
+    """
+    table = pa.Table.from_pandas(data, preserve_index=False) if isinstance(data, pd.DataFrame) else data
+    if os.path.exists(root) and os.listdir(root):
+        if not overwrite:
+            raise FileExistsError('The directory is not empty: {0}'.format(root))
+        shutil.rmtree(root)
+    os.makedirs(root, exist_ok=True)
+    if row_group_bytes:
+        row_group_rows = min(row_group_rows, rows_for_bytes(table, row_group_bytes))
+    if file_bytes:
+        file_rows = min(file_rows, rows_for_bytes(table, file_bytes))
+    sort_by = [sort_by] if isinstance(sort_by, str) else list(sort_by or [])
+    table = table.sort_by([(column, 'ascending') for column in [partition_by] + sort_by])
+    data_table = table.drop_columns([partition_by])
+    written = []
+    for value, start, end in partition_ranges(table[partition_by]):
+        name = HIVE_NULL if value is None else quote(str(value), safe='')
+        directory = os.path.join(root, '{0}={1}'.format(partition_by, name))
+        os.makedirs(directory, exist_ok=True)
+        for number, file_start in enumerate(range(start, end, file_rows)):
+            path = os.path.join(directory, 'part-{0:05d}.parquet'.format(number))
+            with pq.ParquetWriter(path, data_table.schema, **writer_options) as writer:
+                writer.write_table(data_table.slice(file_start, min(file_rows, end - file_start)),
+                                   row_group_size=row_group_rows)
+            written.append(path)
+    pq.write_metadata(table.schema, os.path.join(root, '_common_metadata'))
+    return written
+
+
+# ********** Choosing the writer settings
+
+# pq.write_table(table, path) uses the default settings. tune_writer() writes a sample of the data with every
+# combination of the given settings (row group size, compression codec and level, dictionary encoding, statistics),
+# and measures the write speed, the file size and the time of some typical queries (read_where with a list of columns
+# and a predicate). Every measure is divided by the best value of all the combinations, and the combination with the
+# lowest weighted sum of these ratios is recommended.
+
+CODECS = [('snappy', None), ('zstd', 1), ('zstd', 9), ('gzip', 6), ('lz4', None), ('none', None)]
+
+
+def writer_configs(row_group_sizes=(16384, 131072, 1048576), codecs=CODECS, use_dictionary=(True, False),
+                   write_statistics=(True, False)):
+    """This function returns all the combinations of the settings as pq.write_table keyword arguments."""
+    return [{'row_group_size': row_group_size, 'compression': codec, 'compression_level': level,
+             'use_dictionary': dictionary, 'write_statistics': statistics}
+            for row_group_size, (codec, level), dictionary, statistics
+            in itertools.product(row_group_sizes, codecs, use_dictionary, write_statistics)]
+
+
+def measure_config(table, config, queries, directory, repeat=3):
+    """We write the table with the config and read it with the queries ((columns, predicate) pairs), and return the
+    best write time, the file size and the best total time of the queries."""
+    path = os.path.join(directory, 'tune.parquet')
+    write_times, read_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pq.write_table(table, path, **config)
+        write_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for columns, predicate in queries:
+            read_where(path, columns, predicate)
+        read_times.append(time.perf_counter() - start)
+    return {'write_secs': min(write_times), 'file_bytes': os.path.getsize(path), 'read_secs': min(read_times)}
+
+
+def tune_writer(data, queries, configs=None, weights=None, repeat=3):
+    """We measure the writer configs (writer_configs() by default) on the sample data (a pandas dataframe or a pyarrow
+    Table) and the queries, and return the recommended config and a dataframe with the results of every config,
+    the best first. The weights of the measures are {'write_secs': 1, 'file_bytes': 1, 'read_secs': 1} by default."""
+    table = pa.Table.from_pandas(data, preserve_index=False) if isinstance(data, pd.DataFrame) else data
+    configs = writer_configs() if configs is None else configs
+    weights = weights or {'write_secs': 1, 'file_bytes': 1, 'read_secs': 1}
+    with tempfile.TemporaryDirectory() as directory:
+        results = pd.DataFrame([dict(config, **measure_config(table, config, queries, directory, repeat))
+                                for config in configs])
+    results['write_mb_per_sec'] = table.nbytes / 1024 ** 2 / results['write_secs']
+    results['score'] = sum(weight * results[measure] / results[measure].min() for measure, weight in weights.items())
+    results = results.sort_values('score')
+    recommended = configs[results.index[0]]
+    return dict(recommended), results.reset_index(drop=True)
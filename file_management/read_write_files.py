@@ -1,6 +1,19 @@
 import csv
+import io
+import mmap
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import threading
 from datetime import datetime
 from collections import namedtuple
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+
+import numpy as np
 
 
 # https://docs.python.org/3/library/csv.html
@@ -41,16 +54,37 @@ def read_write_file(file_name, new_file_name):
 
 # ********** Reading and writing CSV files - with csv reader and writer
 
-def read_write_csv(file_name, new_file_name):
+def read_write_csv(file_name, new_file_name, delimiter=',', new_delimiter=None, lineterminator='\r\n'):
     """This procedure reads a csv and writes the content into another file.
     We use the basic reader and writer object.
+    If the file is uniform (see uniform_block: one line terminator, quotes only around the fields that the writer
+    would quote too) and the new file would be the same (same delimiter and line terminator), the file is simply
+    copied. If only the delimiter or the line terminator changes, the file is converted block by block without
+    parsing it line by line (see transcode_csv). Otherwise the reader and the writer do the work.
     """
+    new_delimiter = new_delimiter or delimiter
+    if os.path.getsize(file_name) > 0:
+        with open(file_name, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            first_line = data[:find_line_end(data, 0)]
+            file_lineterminator = '\r\n' if first_line.endswith(b'\r\n') else '\n'
+            if (first_line.endswith(b'\n') and lineterminator in ('\r\n', '\n')
+                    and len(delimiter) == 1 and delimiter not in '"\r\n'
+                    and len(new_delimiter) == 1 and new_delimiter not in '"\r\n'):
+                if new_delimiter == delimiter and lineterminator == file_lineterminator and data[-1:] == b'\n':
+                    blocks = (data[start:end].decode('utf8') for start, end in split_csv_ranges(data, 0, 4 * 1024 ** 2))
+                    if all(uniform_block(text, delimiter, delimiter, lineterminator) is not None for text in blocks):
+                        shutil.copyfile(file_name, new_file_name)  # on Linux it uses os.sendfile, in the kernel
+                        return
+                elif transcode_csv(data, new_file_name, delimiter, new_delimiter, file_lineterminator,
+                                   lineterminator):
+                    return
+
     file = open(file_name, 'r', newline='', encoding='utf8')
-    csv_reader = csv.reader(file, delimiter=',')  # a reader object which will iterate over lines in the given csv file
+    csv_reader = csv.reader(file, delimiter=delimiter)  # a reader object which will iterate over lines in the csv file
 
     new_file = open(new_file_name, 'w', newline='', encoding='utf8')
     # a writer object responsible for converting the user’s data into delimited strings on the given file-like object
-    csv_writer = csv.writer(new_file, delimiter=',')
+    csv_writer = csv.writer(new_file, delimiter=new_delimiter, lineterminator=lineterminator)
 
     for line in csv_reader:
         csv_writer.writerow(line)
@@ -59,6 +93,62 @@ def read_write_csv(file_name, new_file_name):
     new_file.close()
 
 
+# a quoted field: quotes inside the field are doubled ("")
+quoted_field = re.compile(r'("[^"]*(?:""[^"]*)*")')
+
+
+def uniform_block(text, delimiter, new_delimiter, lineterminator, new_lineterminator=None):
+    """This function checks whether the csv writer would write a block of csv lines the same way, only with the new
+    delimiter and line terminator: every line ends with lineterminator, the quotes are only around whole fields, the
+    quoted fields need the quotes (they contain the new delimiter, a quote or a character of the new line terminator),
+    and the non-quoted fields do not contain the new delimiter. If so, it returns the block split into the non-quoted
+    parts and the quoted fields (the odd elements), otherwise None."""
+    new_lineterminator = new_lineterminator or lineterminator
+    parts = quoted_field.split(text) if '"' in text else [text]
+    rest = ''.join(parts[::2])
+    line_ends = rest.count('\n')
+    if ('"' in rest or rest.count('\r') != (line_ends if lineterminator == '\r\n' else 0)
+            or rest.count(lineterminator) != line_ends or (new_delimiter != delimiter and new_delimiter in rest)):
+        return None
+    special = set(new_delimiter + '"' + new_lineterminator)
+    for i in range(1, len(parts), 2):
+        before, field, after = parts[i - 1], parts[i], parts[i + 1]
+        if ((before[-1:] not in (delimiter, '\n') if before else i > 1)
+                or (after[:1] not in (delimiter, lineterminator[0]) if after else i < len(parts) - 2)
+                or special.isdisjoint(field[1:-1])):
+            return None
+    return parts
+
+
+def transcode_block(text, delimiter, new_delimiter, lineterminator, new_lineterminator):
+    """This function changes the delimiter and the line terminator in a block of csv lines, but only outside the quoted
+    fields. It returns None if it cannot be done this way (see uniform_block)."""
+    parts = uniform_block(text, delimiter, new_delimiter, lineterminator, new_lineterminator)
+    if parts is None:
+        return None
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace(delimiter, new_delimiter).replace(lineterminator, new_lineterminator)
+    return ''.join(parts)
+
+
+def transcode_csv(data, new_file_name, delimiter, new_delimiter, lineterminator, new_lineterminator,
+                  chunk_bytes=4 * 1024 * 1024):
+    """We convert the content of a csv file (data: bytes or mmap) block by block to a new delimiter and line terminator.
+    The blocks end at the end of a csv line (see split_csv_ranges). It returns False if a block cannot be converted
+    by transcode_block; then the file has to be written by the csv reader and writer.
+    """
+    with open(new_file_name, 'w', newline='', encoding='utf8') as new_file:
+        for start, end in split_csv_ranges(data, 0, chunk_bytes):
+            new_text = transcode_block(data[start:end].decode('utf8'), delimiter, new_delimiter, lineterminator,
+                                       new_lineterminator)
+            if new_text is None:
+                return False
+            new_file.write(new_text)
+        if not data[-1:] == b'\n':  # the csv writer would end the last line too
+            new_file.write(new_lineterminator)
+    return True
+
+
 # ********** Reading CSV file with validation and writing - using DictReader and DictWriter and a generator function
 
 # a named tuple for original column name, mapped column name and data type
@@ -70,6 +160,41 @@ def parse_timestamp(text):
     return datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
 
 
+@lru_cache(maxsize=None)
+def parse_date_days(text):
+    """This function parses a 'YYYY-MM-DD' string to the number of days since 1970-01-01.
+    The result is cached, because the same dates repeat a lot in a file."""
+    return int(np.datetime64(text, 'D').astype(np.int64))
+
+
+def parse_timestamps(strings):
+    """This function parses a list of '%Y-%m-%d %H:%M:%S' strings to a numpy datetime64[s] array.
+    Instead of calling strptime for every value, we take the digits from their fixed positions for all the values at
+    once, and we parse only the distinct dates (with a cache).
+    """
+    chars = np.asarray(strings, dtype=np.str_)
+    if chars.size == 0:
+        return np.array([], dtype='datetime64[s]')
+    if chars.dtype.itemsize != 19 * 4:  # every character is stored on 4 bytes (UCS-4)
+        raise ValueError("timestamps do not match format '%Y-%m-%d %H:%M:%S'")
+    # the unicode code points of the characters, one row per timestamp, converted to digit values
+    digits = chars.view(np.uint32).reshape(-1, 19).astype(np.int64) - ord('0')
+    separators = np.array([ord(c) for c in '-- ::']) - ord('0')
+    digit_positions = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+    if ((digits[:, [4, 7, 10, 13, 16]] != separators).any()
+            or (digits[:, digit_positions] < 0).any() or (digits[:, digit_positions] > 9).any()):
+        raise ValueError("timestamps do not match format '%Y-%m-%d %H:%M:%S'")
+    hours = digits[:, 11] * 10 + digits[:, 12]
+    minutes = digits[:, 14] * 10 + digits[:, 15]
+    seconds = digits[:, 17] * 10 + digits[:, 18]
+    if (hours > 23).any() or (minutes > 59).any() or (seconds > 59).any():
+        raise ValueError('timestamps contain an invalid time of day')
+    # parsing only the distinct dates, then mapping them back to the values
+    dates, inverse = np.unique(chars.astype('U10'), return_inverse=True)
+    days = np.array([parse_date_days(date) for date in dates.tolist()], dtype=np.int64)
+    return (days[inverse.reshape(-1)] * 86400 + hours * 3600 + minutes * 60 + seconds).astype('datetime64[s]')
+
+
 # We will not load all columns from the file, only some of them. The below list contains named tuple objects for
 # all the columns that we want to import. The named tuple object contains the mapped column name and data type.
 columns = [
@@ -100,26 +225,292 @@ def iter_records(file_name):
             yield record
 
 
-def write_csv_by_dict(file_name, new_file_name):
-    """We loop through the records (dictionaries) returned by iter_records and write them into a new file.
-    We use DictWriter.
+# ********** Reading CSV file in batches - converting a whole block of rows column by column
+
+# Converting the values one-by-one in Python (as iter_records does) is slow for huge files. Instead we read a block of
+# rows, transpose it into columns and convert each column at once into a numpy array. Converters that numpy can do in
+# a single call are listed here (the key is the converter used in the Column named tuple).
+batch_converters = {
+    int: lambda values: np.array(values).astype(np.int64),
+    float: lambda values: np.array(values).astype(np.float64),
+    parse_timestamp: parse_timestamps,
+}
+
+
+def convert_column(col, values):
+    """This function converts a list of string values of a column into a numpy array.
+    If there is no batch converter for the column, we fall back to converting the values one-by-one.
     """
-    new_file = open(new_file_name, 'wt', newline='')
-    fieldnames = [col.dest for col in columns]
-    # an object which operates like a regular writer but maps dictionaries onto output rows
-    writer = csv.DictWriter(new_file, fieldnames=fieldnames)
-    writer.writeheader()
-    file_content = []
-    for record in iter_records(file_name):
-        # writer.writerow(record)  # this way we would write the lines into the file line by line
-        file_content.append(record)
-    writer.writerows(file_content)  # here we create a list of dictionaries and write the content into the file at once
-    new_file.close()
+    batch_convert = batch_converters.get(col.convert)
+    if batch_convert is not None:
+        return batch_convert(values)
+    return np.array([col.convert(value) for value in values])
+
+
+def column_picker(header):
+    """This function returns a function that picks only the columns that we need from a row (by their position in the
+    header), in the order of the columns list."""
+    return itemgetter(*[header.index(col.src) for col in columns])
+
+
+def rows_to_batch(rows):
+    """This function converts a list of rows (picked by column_picker) into a block: a dictionary whose keys are the
+    mapped column names and the values are numpy arrays."""
+    values = list(zip(*rows))  # transposing the rows into columns
+    return {col.dest: convert_column(col, list(values[i])) for i, col in enumerate(columns)}
+
+
+def iter_batches(file_name, batch_size=65536):
+    """We load the file block by block (batch_size rows at once) and return the blocks one-by-one (yield).
+    A block is a dictionary whose keys are the mapped column names and the values are numpy arrays.
+    This procedure is a generator, similar to iter_records, but much faster on huge files."""
+    with open(file_name, 'rt', newline='') as fp:
+        reader = csv.reader(fp)
+        header = next(reader, None)
+        if header is None:  # an empty file
+            return
+        pick = column_picker(header)
+        while True:
+            rows = [pick(row) for row in islice(reader, batch_size) if row]  # empty lines are skipped
+            if not rows:
+                break
+            yield rows_to_batch(rows)
+
+
+def batch_to_rows(batch, fieldnames):
+    """This function converts a block returned by iter_batches back into rows (tuples of Python objects),
+    in the order of the given field names, so that a csv writer can write them."""
+    return zip(*[batch[name].tolist() for name in fieldnames])
+
+
+# ********** Reading CSV file with compiled converters - one generated function per schema and tuple based records
+
+def make_record_type(fieldnames):
+    """This function creates a record class for the given field names. A record is a named tuple (no dictionary per
+    row), but it also has keys(), get() and record['name'] like a dictionary, so DictWriter can write it.
+    A field name that is not a valid attribute name gets a positional attribute (_0, _1, ...), but record['name']
+    and the keys of _asdict() are still the original names."""
+    positions = {name: i for i, name in enumerate(fieldnames)}
+    keys = dict.fromkeys(fieldnames).keys()  # DictWriter uses set operations on the keys
+
+    class Record(namedtuple('Record', fieldnames, rename=True)):
+        __slots__ = ()
+
+        def keys(self):
+            return keys
+
+        def get(self, key, default=None):
+            i = positions.get(key)
+            return default if i is None else tuple.__getitem__(self, i)
+
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                return tuple.__getitem__(self, positions[key])
+            return tuple.__getitem__(self, key)
+
+        def _asdict(self):
+            return dict(zip(fieldnames, self))
 
+    return Record
 
-def read_with_validate_and_write(file_name, new_file_name):
-    """We read the file content and write it into another file, keeping only some columns"""
-    write_csv_by_dict(file_name, new_file_name)
+
+def compile_columns(header, column_list=columns):
+    """This function compiles the columns list (Column named tuples) into a function that converts a row of the csv
+    reader (a list) into a record. Instead of looping through the columns for every row, the generated function
+    contains the converter calls and the row positions directly, for example:
+        def convert_row(row):
+            return new(Record, (convert_0(row[0]), convert_1(row[3]), ...))
+    """
+    record_type = make_record_type([col.dest for col in column_list])
+    namespace = {'new': tuple.__new__, 'Record': record_type}
+    values = []
+    for i, col in enumerate(column_list):
+        namespace['convert_{0}'.format(i)] = col.convert
+        values.append('convert_{0}(row[{1}])'.format(i, header.index(col.src)))
+    source = 'def convert_row(row):\n    return new(Record, ({0},))\n'.format(', '.join(values))
+    exec(source, namespace)
+    return namespace['convert_row']
+
+
+def iter_compiled_records(file_name):
+    """We load the file and return the records (see make_record_type) one-by-one (yield), converted by the function
+    created by compile_columns. It is a faster version of iter_records."""
+    with open(file_name, 'rt', newline='') as fp:
+        reader = csv.reader(fp)
+        header = next(reader, None)
+        if header is None:  # an empty file
+            return
+        convert_row = compile_columns(header)
+        yield from map(convert_row, filter(None, reader))  # empty lines are skipped
+
+
+# ********** Writing big files with constant memory - buffering the lines and writing them in a background thread
+
+class BackgroundWriter:
+    """A file-like object that collects the written text and passes it to a background thread in chunks,
+    which writes the chunks into the real file. A chunk is passed when it reaches flush_rows writes (the csv writer
+    calls write() once per row) or flush_bytes characters, whichever comes first.
+    At most max_chunks chunks can wait for the background thread, so the memory usage stays constant, no matter
+    how big the file is. Meanwhile the csv writer can prepare the next lines while the previous ones are being written.
+    """
+
+    def __init__(self, file, flush_rows=10000, flush_bytes=None, max_chunks=2):
+        self.file = file
+        self.flush_rows = flush_rows
+        self.flush_bytes = flush_bytes
+        self.chunk = []
+        self.chunk_bytes = 0
+        self.error = None
+        self.chunks = queue.Queue(maxsize=max_chunks)  # put() blocks if the background thread is behind
+        self.thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self.thread.start()
+
+    def _write_chunks(self):
+        """The background thread: writing the chunks into the file until it gets None."""
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            if self.error is None:
+                try:
+                    self.file.write(''.join(chunk))
+                except Exception as error:  # it is raised in the main thread at the next flush or close
+                    self.error = error
+
+    def _check_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def write(self, text):
+        self.chunk.append(text)
+        self.chunk_bytes += len(text)
+        if ((self.flush_rows and len(self.chunk) >= self.flush_rows)
+                or (self.flush_bytes and self.chunk_bytes >= self.flush_bytes)):
+            self.flush()
+
+    def flush(self):
+        """Passing the collected text to the background thread."""
+        self._check_error()
+        if self.chunk:
+            self.chunks.put(self.chunk)
+            self.chunk = []
+            self.chunk_bytes = 0
+
+    def close(self):
+        """Writing the rest of the text, waiting for the background thread and closing the file."""
+        try:
+            self.flush()
+        finally:  # the background thread is stopped even if flush() raises the error of a previous chunk
+            try:
+                self.chunks.put(None)
+                self.thread.join()
+            finally:
+                self.file.close()
+        self._check_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_csv_by_dict(file_name, new_file_name, batch_size=None, flush_rows=10000, flush_bytes=None):
+    """We loop through the records returned by iter_compiled_records and write them into a new file.
+    We use DictWriter (the records can be used like dictionaries, the same way as the ones returned by iter_records).
+    If batch_size is given, we loop through the blocks returned by iter_batches instead and write them block by block.
+    The lines are written by a BackgroundWriter in chunks of flush_rows lines or flush_bytes characters, so we never
+    keep the whole file content in the memory.
+    """
+    with BackgroundWriter(open(new_file_name, 'wt', newline=''), flush_rows, flush_bytes) as new_file:
+        fieldnames = [col.dest for col in columns]
+        # an object which operates like a regular writer but maps dictionaries onto output rows
+        writer = csv.DictWriter(new_file, fieldnames=fieldnames)
+        writer.writeheader()
+        if batch_size:
+            for batch in iter_batches(file_name, batch_size):
+                writer.writer.writerows(batch_to_rows(batch, fieldnames))  # the DictWriter's underlying csv writer
+        else:
+            # we could also collect the records into a list and write them at once with writer.writerows(list), but
+            # then the whole file content would be in the memory
+            writer.writerows(iter_compiled_records(file_name))
+
+
+# ********** Reading CSV file in parallel - splitting the file into byte ranges which are converted in a process pool
+
+def find_line_end(data, pos, quotes=0):
+    """This function returns the position after the first line break from pos, which is the end of a csv line.
+    A line break inside a quoted field is not the end of the line, so a line break is the end of the line only if there
+    is an even number of quotes before it in the line. The quotes parameter is the number of quotes from the beginning
+    of the line to pos.
+    """
+    while True:
+        newline = data.find(b'\n', pos)
+        if newline == -1:
+            return len(data)
+        quotes += data[pos:newline].count(b'"')
+        pos = newline + 1
+        if quotes % 2 == 0:
+            return pos
+
+
+def split_csv_ranges(data, start, chunk_bytes):
+    """This function splits the content of a csv file (from the start position) into ranges of about chunk_bytes bytes,
+    and returns them one-by-one (yield) as (start, end) tuples. Every range ends at the end of a csv line."""
+    while start < len(data):
+        end = min(start + chunk_bytes, len(data))
+        end = find_line_end(data, end, data[start:end].count(b'"'))
+        yield start, end
+        start = end
+
+
+def convert_csv_lines(header, text):
+    """This function converts csv lines (text without the header line) with the columns list and returns them as csv
+    formatted text. The header is the list of the column names of the original file."""
+    pick = column_picker(header)
+    rows = [pick(row) for row in csv.reader(io.StringIO(text, newline='')) if row]
+    output = io.StringIO()
+    if rows:
+        csv.writer(output).writerows(batch_to_rows(rows_to_batch(rows), [col.dest for col in columns]))
+    return output.getvalue()
+
+
+def convert_csv_range(task):
+    """The worker function of the process pool: it converts the lines of a byte range of the file and returns them
+    as csv formatted text. The task is a (file_name, header, start, end) tuple."""
+    file_name, header, start, end = task
+    with open(file_name, 'rb') as fp:
+        fp.seek(start)
+        data = fp.read(end - start)
+    return convert_csv_lines(header, data.decode('utf8'))
+
+
+def write_csv_parallel(file_name, new_file_name, processes=None, chunk_bytes=4 * 1024 * 1024):
+    """We split the file into byte ranges of about chunk_bytes bytes, convert them in a process pool and write the
+    results into a new file, in the original order of the lines. The processes parameter is the size of the pool
+    (None means the number of CPUs).
+    """
+    with open(new_file_name, 'wt', newline='') as new_file:
+        csv.writer(new_file).writerow([col.dest for col in columns])
+        if os.path.getsize(file_name) == 0:
+            return
+        with open(file_name, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header_end = find_line_end(data, 0)
+            header = next(csv.reader(io.StringIO(data[:header_end].decode('utf8'), newline='')))
+            tasks = ((file_name, header, start, end) for start, end in split_csv_ranges(data, header_end, chunk_bytes))
+            with multiprocessing.Pool(processes=processes) as pool:
+                for text in pool.imap(convert_csv_range, tasks):  # imap returns the results in the order of tasks
+                    new_file.write(text)
+
+
+def read_with_validate_and_write(file_name, new_file_name, processes=1):
+    """We read the file content and write it into another file, keeping only some columns.
+    If processes is not 1, the file is converted in parallel by a process pool of this size (None: number of CPUs).
+    """
+    if processes == 1:
+        write_csv_by_dict(file_name, new_file_name)
+    else:
+        write_csv_parallel(file_name, new_file_name, processes)
 
 
 if __name__ == "__main__":
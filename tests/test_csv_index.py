@@ -0,0 +1,27 @@
+import json
+import shutil
+
+import pandas as pd
+
+from file_management.csv_index import read_range
+
+
+def test_read_range(tmp_path):
+    shutil.copy('data/taxi.csv', tmp_path / 'taxi.csv')
+    df = pd.read_csv('data/taxi.csv')
+    keys = pd.to_datetime(df['tpep_pickup_datetime'])
+    expected = df[(keys >= '2018-11-01 06:00:00') & (keys < '2018-11-01 07:00:00')].reset_index(drop=True)
+    result = read_range(tmp_path / 'taxi.csv', 'tpep_pickup_datetime', '2018-11-01 06:00:00', '2018-11-01 07:00:00',
+                        block_rows=500)
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected)
+    with open(tmp_path / 'taxi.csv.index.json') as fp:
+        assert len(json.load(fp)['blocks']) == 20
+
+    # the file has changed, so the index is built again
+    with open(tmp_path / 'taxi.csv', 'a') as fp:
+        fp.write('2,2018-11-01 06:30:00,2018-11-01 06:43:24,1,2.57,1,N,211,48,1,14.5,0.5,0.5,4.74,0.0,0.3,20.54\n')
+    result = read_range(tmp_path / 'taxi.csv', 'tpep_pickup_datetime', '2018-11-01 06:00:00', '2018-11-01 07:00:00',
+                        block_rows=500)
+    assert len(result) == len(expected) + 1
+    with open(tmp_path / 'taxi.csv.index.json') as fp:
+        assert len(json.load(fp)['blocks']) == 21
@@ -0,0 +1,210 @@
+import datetime
+import re
+import struct
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from db.bulk_load import copy_parquet, encode_batches, write_frame
+
+
+class FakeCursor:
+    """Stands in for a psycopg2 cursor: copy_expert() reads the whole stream like the server would."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.connection = conn
+
+    def copy_expert(self, sql, file, size=8192):
+        self.conn.statements.append(sql)
+        chunks = iter(lambda: file.read(size), b'')
+        self.conn.data = b''.join(chunks)
+        if self.conn.fail_copy:
+            raise Exception('duplicate key value violates unique constraint')
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql if isinstance(sql, str) else sql.decode('utf8'))
+
+    def mogrify(self, template, args):
+        return template % tuple(b'NULL' if arg is None else repr(arg).encode('utf8') for arg in args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeConnection:
+    encoding = 'UTF8'
+
+    def __init__(self, transaction_status=0):
+        self.statements = []
+        self.data = None
+        self.commits = 0
+        self.rollbacks = 0
+        self.transaction_status = transaction_status
+        self.fail_copy = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def parse_text(data):
+    unescape = {'t': '\t', 'n': '\n', 'r': '\r'}
+    return [[None if value == '\\N' else re.sub(r'\\(.)', lambda m: unescape.get(m.group(1), m.group(1)), value)
+             for value in line.split('\t')]
+            for line in data.decode('utf8').split('\n')[:-1]]
+
+
+def parse_binary(data, formats):
+    assert data.startswith(b'PGCOPY\n\xff\r\n\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+    pos, rows = 19, []
+    while True:
+        (fields,) = struct.unpack_from('>h', data, pos)
+        pos += 2
+        if fields == -1:
+            assert pos == len(data)
+            return rows
+        row = []
+        for format in formats:
+            (length,) = struct.unpack_from('>i', data, pos)
+            pos += 4
+            if length == -1:
+                row.append(None)
+                continue
+            value = data[pos:pos + length]
+            pos += length
+            row.append(value.decode('utf8') if format == 'text' else struct.unpack(format, value)[0])
+        rows.append(row)
+
+
+@pytest.fixture
+def sample(tmp_path):
+    table = pa.table({'c_ean': pa.array([5000001, None, 5000003], pa.int64()),
+                      'price': [1.5, 2.25, None],
+                      'c_promo': ['N', 'tab\there', None],
+                      'note': ['back\\slash', 'new\nline', ''],
+                      'sold': pa.array([datetime.datetime(2000, 1, 1, 0, 0, 1), None,
+                                        datetime.datetime(1999, 12, 31)], pa.timestamp('us'))})
+    path = str(tmp_path / 'sample.parquet')
+    pq.write_table(table, path)
+    return path
+
+
+def test_copy_parquet_text(sample):
+    conn = FakeConnection()
+    assert copy_parquet(conn, sample, 'public.opfcp', batch_size=2) == 3
+    assert conn.statements == ['COPY "public"."opfcp" ("c_ean", "price", "c_promo", "note", "sold") '
+                               'FROM STDIN WITH (FORMAT text)']
+    assert conn.commits == 1
+    assert parse_text(conn.data) == [['5000001', '1.5', 'N', 'back\\slash', '2000-01-01 00:00:01.000000'],
+                                     [None, '2.25', 'tab\there', 'new\nline', None],
+                                     ['5000003', None, None, '', '1999-12-31 00:00:00.000000']]
+
+
+def test_copy_parquet_binary(sample):
+    conn = FakeConnection()
+    assert copy_parquet(conn, sample, 'opfcp', format='binary', batch_size=2) == 3
+    assert conn.statements[0].endswith('(FORMAT binary)')
+    assert parse_binary(conn.data, ['>q', '>d', 'text', 'text', '>q']) == [
+        [5000001, 1.5, 'N', 'back\\slash', 1000000],
+        [None, 2.25, 'tab\there', 'new\nline', None],
+        [5000003, None, None, '', -86400 * 10 ** 6]]
+
+
+def test_copy_parquet_error(tmp_path):
+    with pytest.raises(ValueError):
+        list(encode_batches([pa.record_batch({'d': pa.array([1], pa.decimal128(5, 2))})], 'binary'))
+    path = str(tmp_path / 'decimal.parquet')
+    pq.write_table(pa.table({'d': pa.array([1, 2], pa.decimal128(5, 2))}), path)
+    conn = FakeConnection()
+    with pytest.raises(ValueError):
+        copy_parquet(conn, path, 'opfcp', format='binary')
+    assert conn.rollbacks == 1 and conn.commits == 0
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({'c_ean': [5000001, 5000002, 5000003], 'price': [1.5, float('nan'), 3.0],
+                         'c_promo': ['N', None, 'A']})
+
+
+def test_write_frame_append(frame):
+    conn = FakeConnection()
+    assert write_frame(conn, frame, 'opfcp', chunk_rows=2) == 3
+    assert conn.statements == ['COPY "opfcp" ("c_ean", "price", "c_promo") FROM STDIN WITH (FORMAT text)']
+    assert parse_text(conn.data) == [['5000001', '1.5', 'N'], ['5000002', None, None], ['5000003', '3', 'A']]
+    assert conn.commits == 1
+
+
+def test_write_frame_upsert(frame):
+    conn = FakeConnection()
+    write_frame(conn, frame, 'opfcp', mode='upsert', key='c_ean')
+    staging = conn.statements[0].split('"')[1]
+    assert conn.statements[0] == 'CREATE TEMPORARY TABLE "{0}" (LIKE "opfcp" INCLUDING DEFAULTS)'.format(staging)
+    assert conn.statements[1].startswith('COPY "{0}" ("c_ean", "price", "c_promo")'.format(staging))
+    assert conn.statements[2] == ('INSERT INTO "opfcp" ("c_ean", "price", "c_promo") SELECT "c_ean", "price", '
+                                  '"c_promo" FROM "{0}" ON CONFLICT ("c_ean") DO UPDATE SET "price" = '
+                                  'EXCLUDED."price", "c_promo" = EXCLUDED."c_promo"'.format(staging))
+    assert conn.statements[3] == 'DROP TABLE "{0}"'.format(staging)
+
+    conn = FakeConnection()
+    write_frame(conn, frame, 'opfcp', mode='upsert', key=['c_ean'], method='values', chunk_rows=2, page_size=1)
+    assert len(conn.statements) == 3
+    assert conn.statements[1] == ('INSERT INTO "opfcp" ("c_ean", "price", "c_promo") VALUES (5000002,NULL,NULL) '
+                                  'ON CONFLICT ("c_ean") DO UPDATE SET "price" = EXCLUDED."price", '
+                                  '"c_promo" = EXCLUDED."c_promo"')
+    assert conn.commits == 1
+
+
+def test_write_frame_in_transaction(frame):
+    conn = FakeConnection(transaction_status=2)  # the caller has an open transaction
+    write_frame(conn, frame, 'opfcp')
+    assert conn.statements[0] == 'SAVEPOINT write_frame' and conn.statements[-1] == 'RELEASE SAVEPOINT write_frame'
+    assert conn.commits == 0
+
+    conn.fail_copy = True
+    with pytest.raises(Exception, match='duplicate key'):
+        write_frame(conn, frame, 'opfcp')
+    assert conn.statements[-1] == 'ROLLBACK TO SAVEPOINT write_frame'
+    assert conn.commits == 0 and conn.rollbacks == 0
+
+    conn = FakeConnection()
+    conn.fail_copy = True
+    with pytest.raises(Exception, match='duplicate key'):
+        write_frame(conn, frame, 'opfcp')
+    assert conn.rollbacks == 1 and conn.commits == 0
+    with pytest.raises(ValueError):
+        write_frame(conn, frame, 'opfcp', mode='upsert')
+
+
+def test_encode_binary_widens_types():
+    batch = pa.record_batch({'a': pa.array([-5, None], pa.int8()), 'b': pa.array([200, 1], pa.uint8()),
+                             'c': pa.array([1.5, 2], pa.float16()), 'd': pa.array([2 ** 40, 0], pa.uint64()),
+                             'e': pa.array([1499, 1500], pa.timestamp('ns'))})
+    data = b''.join(encode_batches([batch], 'binary'))
+    epoch = 946684800 * 10 ** 6
+    assert parse_binary(data, ['>h', '>h', '>f', '>q', '>q']) == [[-5, 200, 1.5, 2 ** 40, 1 - epoch],
+                                                                  [None, 1, 2.0, 0, 2 - epoch]]
+    with pytest.raises(ValueError, match='uint64'):
+        list(encode_batches([pa.record_batch({'d': pa.array([2 ** 63], pa.uint64())})], 'binary'))
+
+
+def test_encode_empty_batch_and_bytea():
+    empty = pa.record_batch({'a': pa.array([], pa.int32())})
+    assert b''.join(encode_batches([empty], 'binary')) == b''.join(encode_batches([], 'binary'))
+    assert b''.join(encode_batches([empty], 'text')) == b''
+    batch = pa.record_batch({'a': pa.array([b'\x00\xff\t', None, b''], pa.binary())})
+    assert b''.join(encode_batches([batch.slice(0)], 'text')) == b'\\\\x00ff09\n\\N\n\\\\x\n'
@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+
+import db.pool
+from db.pool import ConnectionPool, PoolTimeout
+from db.postgres import read_config
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        if self.conn.broken:
+            raise Exception('server closed the connection unexpectedly')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(db.pool, 'monotonic', clock)
+    return clock
+
+
+def test_pool_reuses_and_limits(clock):
+    opened = []
+    pool = ConnectionPool(lambda: opened.append(FakeConnection()) or opened[-1], min_size=1, max_size=2, timeout=0)
+    assert len(opened) == 1
+    with pool.connection() as first:
+        assert first is opened[0]
+        second = pool.getconn()
+        assert pool.stats()['in_use'] == 2
+        with pytest.raises(PoolTimeout):
+            pool.getconn()
+        pool.putconn(second)
+    assert len(opened) == 2
+    stats = pool.stats()
+    assert (stats['checkouts'], stats['in_use'], stats['idle'], stats['timeouts']) == (2, 0, 2, 1)
+    pool.close()
+    assert all(conn.closed for conn in opened)
+
+
+def test_pool_health_check_and_recycling(clock):
+    opened = []
+    pool = ConnectionPool(lambda: opened.append(FakeConnection()) or opened[-1], min_size=1, max_size=3,
+                          max_idle=10, max_lifetime=100)
+    a, b = pool.getconn(), pool.getconn()
+    pool.putconn(b)
+    pool.putconn(a)
+    a.broken = True
+    assert pool.getconn() is b  # a is taken first (most recently used), but it fails the check
+    assert a.closed and pool.stats()['failed_checks'] == 1
+    pool.putconn(b)
+
+    clock.now += 11  # b is idle for too long, but it is the last one (min_size)
+    assert pool.getconn() is b
+    pool.putconn(b)
+    clock.now += 100  # b is too old
+    c = pool.getconn()
+    assert c is not b and b.closed and pool.stats()['recycled'] == 1
+    pool.putconn(c)
+
+
+def test_pool_waits_for_free_connection():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, timeout=5)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, [conn]).start()
+    assert pool.getconn() is conn
+    assert pool.stats()['max_wait_secs'] > 0.01
+
+
+def test_read_config_is_cached(tmp_path):
+    config = tmp_path / 'database.ini'
+    config.write_text('[postgresql]\nhost=localhost\n')
+    assert read_config(str(config)) == {'host': 'localhost'}
+    config.write_text('[postgresql]\nhost=elsewhere\n')
+    assert read_config(str(config)) == {'host': 'localhost'}
+    with pytest.raises(Exception, match='Section other not found'):
+        read_config(str(config), 'other')
+
+
+def test_pool_recycles_connections_after_burst(clock):
+    pool = ConnectionPool(FakeConnection, min_size=1, max_size=5, max_idle=10)
+    burst = [pool.getconn() for _ in range(5)]
+    for conn in burst:
+        pool.putconn(conn)
+    for _ in range(100):  # a single client after the burst
+        clock.now += 1
+        with pool.connection():
+            pass
+    stats = pool.stats()
+    assert (stats['open'], stats['idle'], stats['recycled']) == (1, 1, 4)
+    assert sum(1 for conn in burst if conn.closed) == 4
+
+
+def test_read_config_returns_copy(tmp_path):
+    config = tmp_path / 'database.ini'
+    config.write_text('[postgresql]\nhost=localhost\n')
+    read_config(str(config))['host'] = 'changed'
+    assert read_config(str(config)) == {'host': 'localhost'}
+
+
+def test_pool_closed_while_waiting_closes_swept_connections():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, timeout=5)
+    pool.getconn()
+    swept = FakeConnection()
+
+    def sweep():  # an expired connection is swept, then the pool is closed while getconn() waits
+        threading.Timer(0.05, pool.close).start()
+        pool._sweep = lambda: []
+        return [swept]
+
+    pool._sweep = sweep
+    with pytest.raises(PoolTimeout, match='closed'):
+        pool.getconn()
+    assert swept.closed
@@ -0,0 +1,101 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import db.query_cache
+from db.query_cache import QueryCache, normalize_sql, read_tables, written_table
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('create table city (city_id integer primary key, city text, country_id integer)')
+    conn.executemany('insert into city values (?, ?, ?)', [(i, 'City {0}'.format(i), i % 10) for i in range(1, 601)])
+    yield conn
+    conn.close()
+
+
+def test_normalize_sql_and_tables():
+    assert normalize_sql("SELECT  city\n FROM City WHERE city = 'London  X';") == \
+        "select city from city where city = 'London  X'"
+    assert read_tables('select * from public.City c join "Country" using (country_id)') == {'city', 'Country'}
+    assert written_table('UPDATE  public.city SET city = %s') == 'city'
+    assert written_table('select 1') is None
+
+
+def test_read_sql_query_cache(conn):
+    cache = QueryCache(ttl=60)
+    query = 'select city_id, city, country_id from city where country_id = ?'
+    first = cache.read_sql_query(query, conn, params=(3,), index_col='city_id')
+    again = cache.read_sql_query('SELECT city_id, city, country_id\nFROM   city WHERE country_id = ?;', conn,
+                                 params=(3,), index_col='city_id')
+    assert again.equals(first) and again.index.name == 'city_id'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    cache.read_sql_query(query, conn, params=(3,))  # other read options
+    cache.read_sql_query(query, conn, params=(4,), index_col='city_id')
+    assert cache.stats()['misses'] == 3
+
+    cursor = conn.cursor()
+    cache.execute(cursor, 'delete from city where country_id = ?', (3,))
+    assert cache.stats()['entries'] == 0 and cache.stats()['invalidated'] == 3
+    assert len(cache.read_sql_query(query, conn, params=(3,))) == 0
+
+
+def test_fetchall_ttl_and_lru(conn, monkeypatch, tmp_path):
+    now = [1000.0]
+    monkeypatch.setattr(db.query_cache, 'monotonic', lambda: now[0])
+    cache = QueryCache(ttl=10, max_bytes=10000, spill_dir=str(tmp_path), max_spill_bytes=10000)
+    cursor = conn.cursor()
+    rows = cache.fetchall(cursor, 'select city_id, city from city where city_id <= ?', (300,))
+    assert cache.fetchall(cursor, 'select city_id, city from city where city_id <= ?', (300,)) == rows
+    assert cache.stats()['hits'] == 1
+
+    for limit in (301, 302):  # every result is about 4.5 kB: the oldest ones are spilled to disk, then dropped
+        cache.fetchall(cursor, 'select city_id, city from city where city_id <= ?', (limit,))
+    stats = cache.stats()
+    assert stats['spilled'] >= 1 and stats['memory_bytes'] <= 10000 and stats['spilled_bytes'] <= 10000
+    assert cache.fetchall(cursor, 'select city_id, city from city where city_id <= ?', (300,)) == rows
+    assert cache.stats()['hits'] == 2
+
+    now[0] += 11
+    cache.fetchall(cursor, 'select city_id, city from city where city_id <= ?', (300,))
+    assert cache.stats()['expired'] == 1
+    cache.clear()
+    assert list(tmp_path.iterdir()) == []
+
+
+class JsonCursor:
+    """A stand-in cursor that returns json values (dictionaries) like psycopg2 does for a json column."""
+
+    def __init__(self):
+        self.description = None
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        self.description = [('data',)] if sql.startswith('select') else None
+
+    def fetchall(self):
+        return [({'a': 1},), ({'b': 'x'},)]
+
+
+def test_hit_equals_miss(conn, tmp_path):
+    cache = QueryCache(max_bytes=1, spill_dir=str(tmp_path))  # every result is spilled
+    cursor = JsonCursor()
+    miss = cache.fetchall(cursor, 'select data from events')
+    hit = cache.fetchall(cursor, 'select data from events')
+    assert hit == miss == [({'a': 1},), ({'b': 'x'},)] and len(cursor.executed) == 1
+    assert cache.fetchall(cursor, 'update events set data = null') == []
+    assert cache.stats()['entries'] == 0 and cache.stats()['spilled'] == 1
+
+    query = 'select city_id, city, country_id from city where city_id <= 3'
+    expected = pd.read_sql_query(query, conn)
+    for _ in range(2):
+        df = cache.read_sql_query(query, conn)
+        assert df.equals(expected) and df.dtypes.equals(expected.dtypes)
+        df['city'] = 'changed'  # the cached result does not change
+    conn.execute("create table events (data text)")
+    conn.execute("insert into events values ('x'), (NULL)")
+    frames = [cache.read_sql_query('select data, 1.5 as x from events', conn) for _ in range(2)]
+    assert frames[0].equals(frames[1]) and frames[0].dtypes.equals(frames[1].dtypes)
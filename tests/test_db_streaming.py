@@ -0,0 +1,94 @@
+import datetime
+
+import pandas as pd
+import pyarrow as pa
+
+from db.streaming import stream_query
+
+
+class FakeNamedCursor:
+    """Stands in for a psycopg2 named cursor: the rows are "on the server" until fetchmany() asks for them."""
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+        self.itersize = 2000
+        self.description = None
+        self.closed = False
+
+    def execute(self, query, params=None):
+        self.conn.queries.append((query, params))
+        self.rows = iter(self.conn.rows)
+        self.description = self.conn.description
+
+    def fetchmany(self, size):
+        self.conn.fetch_sizes.append(size)
+        return [row for _, row in zip(range(size), self.rows)]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows, description=(('rental_id',), ('rental_date',), ('staff_id',), ('title',))):
+        self.rows = rows
+        self.description = list(description)
+        self.queries = []
+        self.fetch_sizes = []
+        self.cursors = []
+
+    def cursor(self, name=None):
+        assert name is not None
+        self.cursors.append(FakeNamedCursor(self, name))
+        return self.cursors[-1]
+
+
+ROWS = [(i, datetime.datetime(2005, 5, 24) + datetime.timedelta(hours=i), 1 + i % 2, None if i % 3 else 'film')
+        for i in range(10)]
+
+
+def test_stream_query_pandas():
+    conn = FakeConnection(ROWS)
+    chunks = list(stream_query(conn, 'select * from rental where staff_id > %s', (0,), chunk_rows=4,
+                               dtypes={'staff_id': 'int8', 'title': 'string'}))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert conn.queries == [('select * from rental where staff_id > %s', (0,))]
+    assert set(conn.fetch_sizes) == {4} and conn.cursors[0].itersize == 4 and conn.cursors[0].closed
+    df = pd.concat(chunks, ignore_index=True)
+    assert df['staff_id'].dtype == 'int8'
+    assert isinstance(df['title'].dtype, pd.StringDtype)
+    assert df['rental_date'].tolist() == [row[1] for row in ROWS]
+    assert df['title'].isna().tolist() == [row[3] is None for row in ROWS]
+
+
+def test_stream_query_arrow_and_early_stop():
+    conn = FakeConnection(ROWS)
+    chunks = stream_query(conn, 'select * from rental', chunk_rows=3, dtypes={'title': 'category'}, to_arrow=True,
+                          prefetch=1)
+    first = next(chunks)
+    assert isinstance(first, pa.Table) and first.num_rows == 3
+    assert pa.types.is_dictionary(first.schema.field('title').type)
+    chunks.close()
+    assert conn.cursors[0].closed
+    assert len(conn.fetch_sizes) <= 3  # the first chunk and at most prefetch + 1 more
+
+
+def test_stream_query_dtype_only_for_its_column():
+    conn = FakeConnection([(i, 'x', i * 2, 'y') for i in range(5)])
+    chunk = next(stream_query(conn, 'select * from rental', dtypes={'rental_id': 'Int64', 'title': 'string'}))
+    assert str(chunk['rental_id'].dtype) == 'Int64' and str(chunk['staff_id'].dtype) == 'int64'
+    assert str(chunk['title'].dtype) == 'string' and str(chunk['rental_date'].dtype) != 'string'
+
+
+def test_stream_query_same_types_in_every_chunk():
+    # amount is double precision (oid 701), note has no known type: it is inferred from the first value
+    rows = [(i, None, None) for i in range(3)] + [(i, i / 2, 'x' if i == 4 else None) for i in range(3, 9)]
+    conn = FakeConnection(rows, [('rental_id', 23), ('amount', 701), ('note', 0)])
+    tables = list(stream_query(conn, 'select * from payment', chunk_rows=3, to_arrow=True))
+    assert [table.schema.field('amount').type for table in tables] == [pa.float64()] * 3
+    assert [table.schema.field('note').type for table in tables] == [pa.null(), pa.string(), pa.string()]
+    assert pa.concat_tables(tables[1:])['amount'].to_pylist() == [i / 2 for i in range(3, 9)]
+    conn = FakeConnection(rows, [('rental_id', 23), ('amount', 701), ('note', 0)])
+    frames = list(stream_query(conn, 'select * from payment', chunk_rows=3))
+    assert {str(frame['amount'].dtype) for frame in frames} == {'float64'}
+    assert {str(frame['rental_id'].dtype) for frame in frames} == {'int32'}
@@ -0,0 +1,51 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from file_management.df_csv_cache import CsvCache, read_csv_cached
+
+
+def test_read_csv_cached(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    options = dict(usecols=['VendorID', 'tip_amount', 'tpep_pickup_datetime'], dtype={'VendorID': np.int32},
+                   parse_dates=['tpep_pickup_datetime'])
+    expected = pd.read_csv('data/taxi.csv', **options)
+    pd.testing.assert_frame_equal(read_csv_cached('data/taxi.csv', cache_dir, **options), expected)
+    assert len([name for name in os.listdir(cache_dir) if name.endswith('.arrow')]) == 1
+    # the same content in another file and equal options: found in the cache
+    shutil.copy('data/taxi.csv', tmp_path / 'copy.csv')
+    options['dtype'] = {'VendorID': 'int32'}
+    pd.testing.assert_frame_equal(read_csv_cached(tmp_path / 'copy.csv', cache_dir, **options), expected)
+    assert len([name for name in os.listdir(cache_dir) if name.endswith('.arrow')]) == 1
+    # changed content: not the same entry
+    with open(tmp_path / 'copy.csv', 'a') as fp:
+        fp.write('1,2018-10-31 07:10:55,2018-11-01 06:43:24,1,2.57,1,N,211,48,1,14.5,0.5,0.5,4.74,0.0,0.3,20.54\n')
+    assert len(read_csv_cached(tmp_path / 'copy.csv', cache_dir, **options)) == len(expected) + 1
+
+
+def test_csv_cache_evicts_least_recently_used(tmp_path):
+    cache = CsvCache(str(tmp_path / 'cache'))
+    entry_a = cache.entry_path('data/taxi.csv', {'usecols': ['VendorID']})
+    entry_b = cache.entry_path('data/taxi.csv', {'usecols': ['tip_amount']})
+    cache.read_csv('data/taxi.csv', usecols=['VendorID'])
+    cache.read_csv('data/taxi.csv', usecols=['tip_amount'])
+    cache.read_csv('data/taxi.csv', usecols=['VendorID'])  # a is used again, so b is the least recently used
+    cache.max_bytes = os.path.getsize(entry_a)
+    cache.evict()
+    assert os.path.exists(entry_a) and not os.path.exists(entry_b)
+
+
+def test_read_csv_cached_not_cacheable(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    # a function inside an option: str(func) contains its address, so it cannot be a cache key
+    first = read_csv_cached('data/taxi.csv', cache_dir, usecols=['VendorID'], converters={'VendorID': lambda v: 1})
+    second = read_csv_cached('data/taxi.csv', cache_dir, usecols=['VendorID'], converters={'VendorID': lambda v: 2})
+    assert (first['VendorID'] == 1).all() and (second['VendorID'] == 2).all()
+    # an index of datetime objects would come back from Arrow as a DatetimeIndex
+    options = dict(usecols=['VendorID', 'tpep_pickup_datetime'], index_col=['VendorID', 'tpep_pickup_datetime'],
+                   dtype={'tpep_pickup_datetime': object}, parse_dates=['tpep_pickup_datetime'])
+    miss = read_csv_cached('data/taxi.csv', cache_dir, **options)
+    pd.testing.assert_frame_equal(read_csv_cached('data/taxi.csv', cache_dir, **options), miss)
+    assert not [name for name in os.listdir(cache_dir) if name.endswith('.arrow')]
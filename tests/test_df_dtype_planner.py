@@ -0,0 +1,47 @@
+import pandas as pd
+
+from file_management.df_dtype_planner import plan_dtypes, read_csv_planned
+
+
+def test_plan_dtypes():
+    plan = plan_dtypes('data/taxi.csv')
+    assert plan['VendorID'] == 'int8'
+    assert plan['PULocationID'] == 'int16'
+    assert plan['tip_amount'] == 'float32'
+    assert plan['tpep_pickup_datetime'] == 'datetime'
+    assert plan['store_and_fwd_flag'] == 'category'
+
+
+def test_read_csv_planned_widens_per_chunk(tmp_path):
+    df = pd.DataFrame({'a': [1] * 10 + [1000] + [None] * 9 + [2],
+                       'b': ['x', 'y'] * 10 + ['z'],
+                       'c': [0.5] * 20 + [0.1234567891]})
+    df.to_csv(tmp_path / 'test.csv', index=False)
+    result = read_csv_planned(tmp_path / 'test.csv', plan={'a': 'int8', 'b': 'category', 'c': 'float32'},
+                              chunksize=10)
+    assert str(result['a'].dtype) == 'Int16'
+    assert result['a'].tolist()[9:12] == [1, 1000, pd.NA]
+    assert isinstance(result['b'].dtype, pd.CategoricalDtype)
+    assert result['b'].astype(str).tolist() == df['b'].tolist()
+    assert str(result['c'].dtype) == 'float64' and result['c'].iloc[-1] == 0.1234567891
+
+
+def test_read_csv_planned_types_while_parsing(tmp_path, monkeypatch):
+    (tmp_path / 'test.csv').write_text('flag,n\nTrue,1\n,2\nFalse,3\n')
+    options = []
+    read_csv = pd.read_csv
+    monkeypatch.setattr(pd, 'read_csv', lambda *args, **kwargs: options.append(kwargs) or read_csv(*args, **kwargs))
+    result = read_csv_planned(tmp_path / 'test.csv', plan={'flag': 'bool', 'n': 'int8'})
+    assert options[0]['dtype'] == {'flag': 'boolean', 'n': 'Int8'}
+    assert str(result['flag'].dtype) == 'boolean'
+    assert result['flag'].tolist() == [True, pd.NA, False]
+    assert str(result['n'].dtype) == 'int8'
+
+
+def test_read_csv_planned_caller_types(tmp_path):
+    (tmp_path / 'test.csv').write_text('a,b,c\n1,2020-01-01,x\n2,2020-01-02,x\n')
+    assert plan_dtypes(tmp_path / 'test.csv', dtype={'a': 'int64'}, parse_dates=['b']) == {'c': 'category'}
+    result = read_csv_planned(tmp_path / 'test.csv', dtype={'a': 'int64'}, parse_dates=['b'])
+    assert result['a'].dtype == 'int64' and result['a'].tolist() == [1, 2]
+    assert result['b'].dtype.kind == 'M'
+    assert isinstance(result['c'].dtype, pd.CategoricalDtype)
@@ -0,0 +1,30 @@
+import gzip
+import zipfile
+
+import pandas as pd
+
+from file_management.df_export_parallel import to_csv_compressed
+
+
+def test_to_csv_compressed(tmp_path):
+    df = pd.read_csv('data/taxi.csv', index_col=['VendorID', 'tpep_pickup_datetime'],
+                     parse_dates=['tpep_pickup_datetime', 'tpep_dropoff_datetime'])
+    expected = df.to_csv(date_format='%Y-%m-%d %H:%M:%S', header=['A'] * 15).encode('utf8')
+
+    to_csv_compressed(df, tmp_path / 'df.zip', archive_name='df2.csv', block_rows=700, workers=3,
+                      header=['A'] * 15, date_format='%Y-%m-%d %H:%M:%S')
+    with zipfile.ZipFile(tmp_path / 'df.zip') as archive:
+        assert archive.testzip() is None
+        assert archive.read('df2.csv') == expected
+
+    to_csv_compressed(df, tmp_path / 'df.csv.gz', method='gzip', block_rows=700, workers=3,
+                      header=['A'] * 15, date_format='%Y-%m-%d %H:%M:%S')
+    with gzip.open(tmp_path / 'df.csv.gz') as fp:
+        assert fp.read() == expected
+
+
+def test_to_csv_compressed_empty(tmp_path):
+    df = pd.DataFrame({'a': []})
+    to_csv_compressed(df, tmp_path / 'empty.zip', index=False)
+    with zipfile.ZipFile(tmp_path / 'empty.zip') as archive:
+        assert archive.read('empty') == b'a\n'
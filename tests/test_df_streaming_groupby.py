@@ -0,0 +1,29 @@
+import pandas as pd
+
+from file_management.df_streaming_groupby import streaming_groupby, STATS
+
+
+def test_streaming_groupby_matches_groupby():
+    df = pd.read_csv('data/taxi.csv')
+    expected = df.groupby(['VendorID', 'passenger_count'])[['trip_distance', 'tip_amount', 'PULocationID']].agg(STATS)
+    result = streaming_groupby(pd.read_csv('data/taxi.csv', chunksize=1000), ['VendorID', 'passenger_count'],
+                               ['trip_distance', 'tip_amount', 'PULocationID'], distinct=['PULocationID'])
+    pd.testing.assert_frame_equal(result.drop(columns=[('PULocationID', 'nunique')]), expected)
+    nunique = df.groupby(['VendorID', 'passenger_count'])['PULocationID'].nunique()
+    assert ((result['PULocationID', 'nunique'] - nunique).abs() <= nunique * 0.1 + 1).all()
+
+
+def test_streaming_groupby_parallel():
+    chunks = [chunk for chunk in pd.read_csv('data/taxi.csv', chunksize=2500)]
+    sequential = streaming_groupby(chunks, 'payment_type', ['total_amount'], distinct=['DOLocationID'])
+    parallel = streaming_groupby(chunks, 'payment_type', ['total_amount'], distinct=['DOLocationID'], processes=2)
+    pd.testing.assert_frame_equal(sequential, parallel)
+
+
+def test_streaming_groupby_mixed_int_float_chunks():
+    chunks = [pd.DataFrame({'k': [1, 1], 'v': [1, 2]}), pd.DataFrame({'k': [1, 2], 'v': [1.5, 2.7]})]
+    result = streaming_groupby(chunks, 'k', ['v'])
+    assert result['v', 'sum'].tolist() == [4.5, 2.7]
+    assert result['v', 'max'].tolist() == [2.0, 2.7]
+    assert result['v', 'min'].tolist() == [1.0, 2.7]
+    assert result['v', 'sum'].dtype == 'float64'
@@ -1,5 +1,12 @@
+import csv
+import io
+import time
 from datetime import  datetime
-from file_management.read_write_files import parse_timestamp
+import numpy as np
+import pytest
+from file_management.read_write_files import (parse_timestamp, parse_timestamps, columns, iter_records, iter_batches,
+                                              batch_to_rows, BackgroundWriter, write_csv_by_dict,
+                                              write_csv_parallel, read_write_csv, iter_compiled_records)
 
 
 def test_parse_timestamp():
@@ -13,3 +20,116 @@ def test_again():
 def test_fail():
     assert 5 == 4
 
+
+def test_iter_batches_matches_iter_records():
+    records = list(iter_records('data/taxi.csv'))
+    batches = list(iter_batches('data/taxi.csv', batch_size=3000))
+    assert [len(batch['vendor_id']) for batch in batches] == [3000, 3000, 3000, 1000]
+    assert batches[0]['tip'].dtype == np.float64
+    fieldnames = [col.dest for col in columns]
+    rows = [row for batch in batches for row in batch_to_rows(batch, fieldnames)]
+    assert rows == [tuple(record[name] for name in fieldnames) for record in records]
+
+
+def test_parse_timestamps():
+    values = ['2020-06-04 16:33:45', '2020-06-04 00:00:00', '1999-12-31 23:59:59']
+    result = parse_timestamps(values)
+    assert result.dtype == np.dtype('datetime64[s]')
+    assert result.tolist() == [parse_timestamp(value) for value in values]
+
+
+def test_parse_timestamps_invalid():
+    with pytest.raises(ValueError):
+        parse_timestamps(['2020-06-04T16:33:45'])
+
+
+def test_background_writer(tmp_path):
+    with BackgroundWriter(open(tmp_path / 'out.txt', 'wt'), flush_rows=2, flush_bytes=None) as new_file:
+        for line in ['a\n', 'b\n', 'c\n', 'd\n', 'e\n']:
+            new_file.write(line)
+    assert (tmp_path / 'out.txt').read_text() == 'a\nb\nc\nd\ne\n'
+
+
+def test_write_csv_by_dict_empty_file(tmp_path):
+    (tmp_path / 'empty.csv').write_text('')
+    assert list(iter_compiled_records(tmp_path / 'empty.csv')) == []
+    write_csv_by_dict(tmp_path / 'empty.csv', tmp_path / 'out.csv')
+    assert (tmp_path / 'out.csv').read_text().splitlines() == [','.join(col.dest for col in columns)]
+    assert list(iter_batches(tmp_path / 'empty.csv')) == []
+    write_csv_by_dict(tmp_path / 'empty.csv', tmp_path / 'batches.csv', batch_size=10)
+    assert (tmp_path / 'batches.csv').read_text() == (tmp_path / 'out.csv').read_text()
+
+
+class FullFile:
+    closed = False
+
+    def write(self, text):
+        raise OSError('No space left on device')
+
+    def close(self):
+        self.closed = True
+
+
+def test_background_writer_error_stops_thread():
+    file = FullFile()
+    new_file = BackgroundWriter(file, flush_rows=2, flush_bytes=None)
+    new_file.write('a\n')
+    new_file.write('b\n')
+    while new_file.error is None:
+        time.sleep(0.01)
+    new_file.write('c\n')
+    with pytest.raises(OSError):
+        new_file.close()  # flush() raises the error of the first chunk
+    assert not new_file.thread.is_alive() and file.closed
+
+
+def test_write_csv_parallel_quoted_newlines(tmp_path):
+    with open('data/taxi.csv', 'rt', newline='') as fp:
+        lines = fp.readlines()[:200]
+    # putting line breaks and quotes into a quoted field that we do not load
+    lines = [line.replace(',N,', ',"N\n""a\nb""",', 1) if i % 3 == 0 else line for i, line in enumerate(lines)]
+    (tmp_path / 'taxi.csv').write_text(''.join(lines), newline='')
+    write_csv_by_dict(tmp_path / 'taxi.csv', tmp_path / 'sequential.csv')
+    write_csv_parallel(tmp_path / 'taxi.csv', tmp_path / 'parallel.csv', processes=2, chunk_bytes=500)
+    assert (tmp_path / 'parallel.csv').read_bytes() == (tmp_path / 'sequential.csv').read_bytes()
+
+
+def test_read_write_csv_copy_and_transcode(tmp_path):
+    (tmp_path / 'in.csv').write_bytes(b'a,b;c,"d,\r\ne"\r\n1,2,3\r\n')
+    read_write_csv(tmp_path / 'in.csv', tmp_path / 'copy.csv')
+    assert (tmp_path / 'copy.csv').read_bytes() == (tmp_path / 'in.csv').read_bytes()
+    read_write_csv(tmp_path / 'in.csv', tmp_path / 'tab.csv', new_delimiter='\t', lineterminator='\n')
+    assert (tmp_path / 'tab.csv').read_bytes() == b'a\tb;c\t"d,\r\ne"\n1\t2\t3\n'
+    # the non-quoted field b;c has to be quoted, so the file is parsed and written by the csv reader and writer
+    read_write_csv(tmp_path / 'in.csv', tmp_path / 'semicolon.csv', new_delimiter=';')
+    assert (tmp_path / 'semicolon.csv').read_bytes() == b'a;"b;c";"d,\r\ne"\r\n1;2;3\r\n'
+
+
+@pytest.mark.parametrize('content', [b'a,b\n1,2\r\n3,4\n', b'a,b"c\n1,2\n', b'a,"b",c\r\n1,"x\ny",3\r\n',
+                                     b'a,"b"c,d\r\n1,2,3\r\n'])
+@pytest.mark.parametrize('options', [{}, {'new_delimiter': ';'}, {'lineterminator': '\n'}])
+def test_read_write_csv_not_uniform(tmp_path, content, options):
+    (tmp_path / 'in.csv').write_bytes(content)
+    read_write_csv(tmp_path / 'in.csv', tmp_path / 'out.csv', **options)
+    with open(tmp_path / 'in.csv', newline='') as fp:
+        rows = list(csv.reader(fp))
+    expected = io.StringIO()
+    csv.writer(expected, delimiter=options.get('new_delimiter', ','),
+               lineterminator=options.get('lineterminator', '\r\n')).writerows(rows)
+    assert (tmp_path / 'out.csv').read_bytes() == expected.getvalue().encode()
+
+
+def test_compiled_records(tmp_path):
+    records = list(iter_records('data/taxi.csv'))
+    compiled_records = list(iter_compiled_records('data/taxi.csv'))
+    assert [dict(zip(r.keys(), r)) for r in compiled_records] == records
+    record = compiled_records[0]
+    assert record['tip'] == record.tip == record.get('tip') == record[2]
+    assert record.get('unknown', 'default') == 'default'
+    with open(tmp_path / 'records.csv', 'wt', newline='') as fp:
+        writer = csv.DictWriter(fp, fieldnames=[col.dest for col in columns])
+        writer.writerows(compiled_records)
+    with open(tmp_path / 'dicts.csv', 'wt', newline='') as fp:
+        writer = csv.DictWriter(fp, fieldnames=[col.dest for col in columns])
+        writer.writerows(records)
+    assert (tmp_path / 'records.csv').read_bytes() == (tmp_path / 'dicts.csv').read_bytes()
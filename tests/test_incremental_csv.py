@@ -0,0 +1,26 @@
+from file_management.incremental_csv import iter_new_records
+
+
+def test_iter_new_records(tmp_path):
+    with open('data/taxi.csv', 'rt', newline='') as fp:
+        lines = fp.readlines()
+    file_name = tmp_path / 'taxi.csv'
+    file_name.write_text(''.join(lines[:51]), newline='')
+    assert len(list(iter_new_records(file_name, chunk_bytes=1000))) == 50
+    assert list(iter_new_records(file_name)) == []
+
+    with open(file_name, 'at', newline='') as fp:
+        fp.write(''.join(lines[51:61]) + lines[61][:20])  # the last line is not finished yet
+    records = list(iter_new_records(file_name, chunk_bytes=1000))
+    full_scan = list(iter_new_records(file_name, str(tmp_path / 'other.checkpoint')))
+    assert len(records) == 10 and records == full_scan[50:]
+    with open(file_name, 'at', newline='') as fp:
+        fp.write(lines[61][20:])
+    assert len(list(iter_new_records(file_name))) == 1
+
+    # rewritten with other lines: the whole file is read again
+    file_name.write_text(''.join(lines[:1] + lines[101:162]), newline='')
+    assert len(list(iter_new_records(file_name))) == 61
+    # truncated
+    file_name.write_text(''.join(lines[:21]), newline='')
+    assert len(list(iter_new_records(file_name))) == 20
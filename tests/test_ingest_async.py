@@ -0,0 +1,31 @@
+from file_management.ingest_async import ingest_directory
+from file_management.read_write_files import write_csv_by_dict
+
+
+def test_ingest_directory(tmp_path):
+    src_dir, dst_dir = tmp_path / 'src', tmp_path / 'dst'
+    src_dir.mkdir()
+    with open('data/taxi.csv', 'rt', newline='') as fp:
+        lines = fp.readlines()
+    for day in range(5):
+        (src_dir / 'taxi_{0}.csv'.format(day)).write_text(''.join(lines[:1] + lines[1 + day * 100:101 + day * 100]),
+                                                          newline='')
+    (src_dir / 'broken.csv').write_text('VendorID,passenger_count\n1,2\n')
+
+    results = ingest_directory(src_dir, dst_dir, concurrency=3)
+
+    assert [(r.src.rsplit('/', 1)[1], r.rows) for r in results if r.error is None] == \
+        [('taxi_{0}.csv'.format(day), 100) for day in range(5)]
+    assert [r.src.rsplit('/', 1)[1] for r in results if r.error is not None] == ['broken.csv']
+    write_csv_by_dict(src_dir / 'taxi_2.csv', tmp_path / 'expected.csv')
+    assert (dst_dir / 'taxi_2.csv').read_bytes() == (tmp_path / 'expected.csv').read_bytes()
+
+
+def test_ingest_directory_empty_file(tmp_path):
+    src_dir, dst_dir = tmp_path / 'src', tmp_path / 'dst'
+    src_dir.mkdir()
+    (src_dir / 'empty.csv').write_text('')
+
+    results = ingest_directory(src_dir, dst_dir, concurrency=2)
+
+    assert len(results) == 1 and isinstance(results[0].error, ValueError)
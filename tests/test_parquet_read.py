@@ -0,0 +1,126 @@
+import datetime
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from file_management.parquet_read import (read_where, read_pandas_low_memory, iter_row_groups, read_pandas_typed,
+                                          iter_rows)
+from file_management.read_write_files import make_record_type
+
+
+def write_sorted_taxi(path, row_group_size=1000):
+    table = pq.read_table('data/taxi.parquet').sort_by('tpep_pickup_datetime')
+    pq.write_table(table, path, row_group_size=row_group_size)
+    return table.to_pandas()
+
+
+def test_read_where(tmp_path):
+    df = write_sorted_taxi(tmp_path / 'taxi.parquet')
+    low, high = datetime.datetime(2018, 11, 1, 6), datetime.datetime(2018, 11, 1, 7)
+    table, report = read_where(tmp_path / 'taxi.parquet', ['VendorID', 'tip_amount'],
+                               [('tpep_pickup_datetime', 'between', (low, high)), ('VendorID', 'in', [1])])
+    expected = df[df['tpep_pickup_datetime'].between(low, high) & (df['VendorID'] == 1)]
+    assert table.column_names == ['VendorID', 'tip_amount']
+    assert table.to_pandas()['tip_amount'].tolist() == expected['tip_amount'].tolist()
+    assert report['row_groups'] == 10 and report['skipped_row_groups'] == 8 and report['skipped_bytes'] > 0
+
+
+def test_read_where_null_counts(tmp_path):
+    table = pa.table({'a': pa.array([None, None, 1, 2], type=pa.int64()), 'b': [1, 2, 3, 4]})
+    pq.write_table(table, tmp_path / 'nulls.parquet', row_group_size=2)
+    result, report = read_where(tmp_path / 'nulls.parquet', ['b'], [('a', '>=', 0)])
+    assert result['b'].to_pylist() == [3, 4] and report['skipped_row_groups'] == 1
+    result, report = read_where(tmp_path / 'nulls.parquet', ['b'], [('a', 'is_null', None)])
+    assert result['b'].to_pylist() == [1, 2] and report['skipped_row_groups'] == 1
+
+
+def test_read_pandas_low_memory():
+    expected = pq.read_table('data/taxi.parquet', columns=['VendorID', 'store_and_fwd_flag']).to_pandas()
+    df = read_pandas_low_memory('data/taxi.parquet', columns=['VendorID', 'store_and_fwd_flag'])
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_iter_row_groups(tmp_path):
+    df = write_sorted_taxi(tmp_path / 'taxi.parquet', row_group_size=700)
+    tables = list(iter_row_groups(tmp_path / 'taxi.parquet', ['VendorID', 'tip_amount'], workers=3, prefetch=2))
+    assert [table.num_rows for table in tables] == [700] * 14 + [200]
+    assert pa.concat_tables(tables)['tip_amount'].to_pylist() == df['tip_amount'].tolist()
+    frames = iter_row_groups(tmp_path / 'taxi.parquet', workers=2, to_pandas=True)
+    assert isinstance(next(frames), pd.DataFrame)
+    frames.close()
+
+
+def test_iter_row_groups_close_early(tmp_path, monkeypatch):
+    write_sorted_taxi(tmp_path / 'taxi.parquet', row_group_size=700)
+    read = []
+    read_row_group = pq.ParquetFile.read_row_group
+
+    def slow_read_row_group(self, i, *args, **kwargs):
+        time.sleep(0.05)
+        read.append(i)
+        return read_row_group(self, i, *args, **kwargs)
+
+    monkeypatch.setattr(pq.ParquetFile, 'read_row_group', slow_read_row_group)
+    tables = iter_row_groups(tmp_path / 'taxi.parquet', workers=1, prefetch=10)
+    next(tables)
+    tables.close()  # the pending reads are cancelled, the running one is waited for
+    count = len(read)
+    time.sleep(0.2)
+    assert count == len(read) <= 3
+
+
+def test_read_pandas_typed():
+    dtypes = {'VendorID': 'int8', 'store_and_fwd_flag': 'category', 'PULocationID': 'category',
+              'tip_amount': 'float32', 'passenger_count': 'Int16'}
+    df = read_pandas_typed('data/taxi.parquet', dtypes, columns=list(dtypes))
+    assert df.dtypes.astype(str).to_dict() == dtypes
+    expected = pq.read_table('data/taxi.parquet', columns=list(dtypes)).to_pandas().astype(dtypes)
+    pd.testing.assert_frame_equal(df, expected, check_categorical=False)
+
+
+def test_iter_rows(tmp_path):
+    path = str(tmp_path / 'taxi.parquet')
+    write_sorted_taxi(path)
+    table = pq.read_table(path)
+    expected = table.select(['VendorID', 'tip_amount']).to_pylist()
+    rows = iter_rows(path, ['VendorID', 'tip_amount'], batch_size=300)
+    first = next(rows)
+    assert first['tip_amount'] == first.tip_amount == first.get('tip_amount') == expected[0]['tip_amount']
+    assert list(first.keys()) == ['VendorID', 'tip_amount']
+    assert [first._asdict()] + [row._asdict() for row in rows] == expected
+    assert len(list(iter_rows(path))[0]) == table.num_columns
+
+
+def test_iter_rows_invalid_names(tmp_path):
+    path = str(tmp_path / 'names.parquet')
+    pq.write_table(pa.table({'my col': [1, 2], 'class': ['a', 'b']}), path)
+    rows = list(iter_rows(path))
+    assert [row._asdict() for row in rows] == [{'my col': 1, 'class': 'a'}, {'my col': 2, 'class': 'b'}]
+    assert rows[0]['my col'] == rows[0]._0 == 1 and rows[0].get('class') == 'a'
+    record = make_record_type(['my col', 'class'])(1, 'a')
+    assert record._asdict() == {'my col': 1, 'class': 'a'}
+
+
+def test_read_pandas_typed_same_arrow_type(tmp_path):
+    path = str(tmp_path / 'types.parquet')
+    pq.write_table(pa.table({'a': [1, 2], 'b': [3, None], 'c': ['x', 'y'], 'd': ['z', None]}), path)
+    df = read_pandas_typed(path, {'a': 'int16', 'b': 'Int16', 'c': 'string'})
+    assert list(df.columns) == ['a', 'b', 'c', 'd']
+    assert (str(df['a'].dtype), str(df['b'].dtype), str(df['c'].dtype)) == ('int16', 'Int16', 'string')
+    assert df['d'].dtype == pq.read_table(path, columns=['d']).to_pandas()['d'].dtype
+    assert df['b'].tolist() == [3, pd.NA]
+    with pytest.raises(KeyError, match='not in the file: e'):
+        read_pandas_typed(path, {'e': 'category'})
+
+
+def test_read_pandas_typed_categories(tmp_path):
+    path = str(tmp_path / 'categories.parquet')
+    pq.write_table(pa.table({'a': [1, 2, 1], 'b': ['x', 'y', 'z']}), path)
+    order = pd.CategoricalDtype(['z', 'y', 'x', 'w'], ordered=True)
+    df = read_pandas_typed(path, {'a': 'category', 'b': order})
+    assert df['b'].dtype == order and df['b'].tolist() == ['x', 'y', 'z']
+    assert df['b'].max() == 'x'
+    assert list(df['a'].cat.categories) == [1, 2]
@@ -0,0 +1,52 @@
+import datetime
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from file_management.parquet_read import read_dataset
+from file_management.parquet_write import tune_writer, write_partitioned, writer_configs
+
+
+def test_write_partitioned(tmp_path):
+    table = pq.read_table('data/taxi.parquet')
+    root = str(tmp_path / 'taxi')
+    files = write_partitioned(table, root, 'VendorID', 'tpep_pickup_datetime', row_group_rows=500, file_rows=2000)
+    assert sorted(os.listdir(root)) == ['VendorID=1', 'VendorID=2', 'VendorID=4', '_common_metadata']
+    assert sum(pq.ParquetFile(path).metadata.num_rows for path in files) == table.num_rows
+    for path in files:
+        metadata = pq.ParquetFile(path).metadata
+        assert metadata.num_rows <= 2000
+        assert all(metadata.row_group(i).num_rows <= 500 for i in range(metadata.num_row_groups))
+    pickups = pq.read_table(os.path.join(root, 'VendorID=2', 'part-00000.parquet'))['tpep_pickup_datetime']
+    assert pickups.to_pylist() == sorted(pickups.to_pylist())
+
+    low = datetime.datetime(2018, 11, 1, 6)
+    result = read_dataset(root, ['VendorID', 'tip_amount'], [('VendorID', '=', 1), ('tpep_pickup_datetime', '>=', low)])
+    df = table.to_pandas()
+    expected = df[(df['VendorID'] == 1) & (df['tpep_pickup_datetime'] >= low)]
+    assert result.schema.field('VendorID').type == table.schema.field('VendorID').type
+    assert sorted(result['tip_amount'].to_pylist()) == sorted(expected['tip_amount'].tolist())
+
+
+def test_tune_writer():
+    table = pq.read_table('data/taxi.parquet')
+    configs = writer_configs(row_group_sizes=(1000, 10000), codecs=[('snappy', None), ('zstd', 3)],
+                             write_statistics=(True,))
+    recommended, results = tune_writer(table, [(['tip_amount'], [('VendorID', '=', 1)])], configs, repeat=1)
+    assert len(results) == len(configs) == 8
+    assert recommended in configs
+    assert results['score'].is_monotonic_increasing
+    assert (results['file_bytes'] > 0).all()
+
+
+def test_write_partitioned_nullable_int_key(tmp_path):
+    table = pa.table({'k': pa.array([1, None, 2, 1, None], pa.int64()), 'v': [1.0, 2.0, 3.0, 4.0, 5.0]})
+    root = str(tmp_path / 'data')
+    write_partitioned(table, root, 'k', 'v', file_bytes=32)
+    assert sorted(os.listdir(root)) == ['_common_metadata', 'k=1', 'k=2', 'k=__HIVE_DEFAULT_PARTITION__']
+    assert len(os.listdir(os.path.join(root, 'k=1'))) == 2  # about 16 bytes per row, so 1 row per file
+    result = read_dataset(root, ['k', 'v'])
+    assert sorted(zip(result['v'].to_pylist(), result['k'].to_pylist())) == [
+        (1.0, 1), (2.0, None), (3.0, 2), (4.0, 1), (5.0, None)]
+    assert read_dataset(root, ['v'], [('k', '=', 1)])['v'].to_pylist() == [1.0, 4.0]